@@ -2,8 +2,29 @@
 
 from .. import util
 util.import_all_from(__package__, [
+    '.alarms_',
+    '.binlog_',
+    '.bus_',
+    '.capture_',
     '.chy506r_',
+    '.decimate_',
+    '.devicepool_',
+    '.framer_',
+    '.index_',
+    '.liveplotter_',
+    '.metrics_',
+    '.parser_',
     '.plotter_',
-])
+    '.process_',
+    '.ring_',
+    '.rollup_',
+    '.sample_',
+    '.server_',
+    '.simulator_',
+    '.sqlite_',
+    '.stats_',
+    '.trace_',
+    '.writer_',
+], lazy=True)
 
 # vim: set ft=python et ts=4 sw=4:
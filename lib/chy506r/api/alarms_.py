@@ -0,0 +1,409 @@
+# -*- coding: utf8 -*-
+
+import ast
+import collections
+import os
+import subprocess
+import sys
+import threading
+
+from .bus_ import Subscriber
+from .sample_ import Timeline
+from .stats_ import RunningStats
+
+__all__ = ('Rule', 'AlarmEvent', 'AlarmEngine', 'CommandAction', 'load_rules', 'RAISED', 'CLEARED')
+
+
+RAISED, CLEARED = 'raised', 'cleared'
+
+CHANNELS = ('t1', 't2')
+_functions = {'abs': abs, 'min': min, 'max': max}
+_nodes = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+          ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Gt, ast.GtE, ast.Lt,
+          ast.LtE, ast.Eq, ast.NotEq, ast.Call, ast.Name, ast.Load)
+_template = ast.parse('lambda t1, t2, rates: None', mode='eval')
+_nan = float('nan')
+
+# numbers parse into ast.Num before Python 3.8, subscripts wrap their index
+# into ast.Index before 3.9
+if sys.version_info >= (3, 8):
+    _Number = ast.Constant
+
+    def _number(node):
+        return node.value
+
+    def _constant(value):
+        return ast.Constant(value=value)
+else:  # pragma: no cover
+    _Number = ast.Num
+
+    def _number(node):
+        return node.n
+
+    def _constant(value):
+        if isinstance(value, tuple):
+            return ast.Tuple(elts=[_constant(v) for v in value], ctx=ast.Load())
+        return ast.Str(s=value) if isinstance(value, str) else ast.Num(n=value)
+
+
+def _index(node):
+    return node if sys.version_info >= (3, 9) else ast.Index(value=node)
+
+
+class AlarmEvent(collections.namedtuple('AlarmEvent', ('rule', 'device', 'state', 'time', 'sample'))):
+    """Change of state of a rule: rule name, device (as given to the
+    engine), state (RAISED or CLEARED), time of the sample (seconds since
+    midnight of the first day) and the sample itself"""
+
+    __slots__ = ()
+
+
+class _Rates(ast.NodeTransformer):
+    """Replaces rate(channel, window) calls with rates[(channel, window)]
+    lookups, collecting the windows needed"""
+
+    def __init__(self):
+        self.windows = set()
+
+    def visit_Call(self, node):
+        if not (isinstance(node.func, ast.Name) and node.func.id == 'rate'):
+            return self.generic_visit(node)
+        args = node.args
+        if node.keywords or len(args) != 2 or not isinstance(args[0], ast.Name) or \
+           args[0].id not in CHANNELS or not isinstance(args[1], _Number) or \
+           not isinstance(_number(args[1]), (int, float)) or _number(args[1]) <= 0:
+            raise ValueError("rate() takes a channel and a window in seconds, e.g. rate(t1, 60)")
+        key = (args[0].id, _number(args[1]))
+        self.windows.add(key)
+        return ast.copy_location(ast.Subscript(value=ast.Name(id='rates', ctx=ast.Load()),
+                                               slice=_index(_constant(key)), ctx=ast.Load()), node)
+
+
+def _check(tree, text):
+    for node in ast.walk(tree):
+        if not isinstance(node, _nodes + (_Number, )):
+            raise ValueError("unsupported syntax in %r: %s" % (text, type(node).__name__))
+        if isinstance(node, ast.Name) and node.id not in CHANNELS + tuple(_functions) + ('rate', ):
+            raise ValueError("unknown name in %r: %s" % (text, node.id))
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise ValueError("unsupported call in %r" % text)
+        if isinstance(node, _Number) and not isinstance(_number(node), (int, float)):
+            raise ValueError("unsupported constant in %r: %r" % (text, _number(node)))
+
+
+def _compile(expression, name):
+    """Compile expression (text or parsed) into function(t1, t2, rates).
+    Returns (function, set of (channel, window) rates needed)"""
+    if isinstance(expression, ast.AST):
+        tree = expression
+    else:
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError("invalid expression %r: %s" % (expression, e.msg))
+    _check(tree, expression)
+    rates = _Rates()
+    body = rates.visit(tree.body)
+    func = ast.Expression(body=ast.Lambda(args=_template.body.args, body=body))
+    try:
+        code = compile(ast.fix_missing_locations(func), '<rule %s>' % name, 'eval')
+    except (TypeError, ValueError) as e:
+        raise ValueError("can't compile rule %s: %s" % (name, e))
+    return eval(code, dict(_functions, __builtins__={})), rates.windows
+
+
+class Rule(object):
+    """Alarm rule: condition on the sample stream of a device.
+
+    condition is an expression of t1, t2 (temperatures of the current
+    sample) and rate(t1, seconds) / rate(t2, seconds) (rate of change in
+    °C/min over the given window), using arithmetic, comparisons, and/or/
+    not and abs(), min() and max(), e.g. 't1 > 1200', 'abs(t1 - t2) > 50'
+    or 'rate(t1, 60) > 5'. Expressions are compiled once into functions.
+
+    The alarm is raised after condition held for delay consecutive samples
+    and cleared after clear (by default: not condition) held for
+    clear_delay samples. With hysteresis, for a condition 'a > b' (or >=)
+    the clear condition is 'a < b - hysteresis', for 'a < b' (or <=) it is
+    'a > b + hysteresis'. Rates are NaN until their window fills, which
+    makes comparisons false.
+
+    If devices are given, the rule applies to those devices only."""
+
+    def __init__(self, name, condition, clear=None, hysteresis=None, delay=1, clear_delay=1,
+                 devices=None):
+        if clear is not None and hysteresis is not None:
+            raise ValueError("rule %s: give either clear or hysteresis" % name)
+        self._name = name
+        self._condition = condition
+        self._clear = clear
+        self._hysteresis = hysteresis
+        self._delay = max(int(delay), 1)
+        self._clear_delay = max(int(clear_delay), 1)
+        self._devices = None if devices is None else frozenset(devices)
+        self._test, windows = _compile(condition, name)
+        if hysteresis is not None:
+            clear = self._clear_condition(condition, hysteresis)
+        if clear is None:
+            test = self._test
+            self._reset = lambda t1, t2, rates: not test(t1, t2, rates)
+        else:
+            self._reset, more = _compile(clear, name)
+            windows |= more
+        self._windows = frozenset(windows)
+
+    @classmethod
+    def parse(cls, text):
+        """Create rule from 'NAME: CONDITION [| option=value ...]', options
+        being hysteresis, delay and clear_delay, e.g.
+        'kiln hot: t1 > 1200 | hysteresis=10 delay=3'"""
+        name, sep, rest = text.partition(':')
+        if not sep or not name.strip():
+            raise ValueError("rule must be given as 'NAME: CONDITION': %r" % text)
+        condition, _, options = rest.partition('|')
+        kw = {}
+        for option in options.split():
+            key, sep, value = option.partition('=')
+            if not sep or key not in ('hysteresis', 'delay', 'clear_delay'):
+                raise ValueError("invalid option of rule %s: %r" % (name.strip(), option))
+            kw[key] = float(value) if key == 'hysteresis' else int(value)
+        return cls(name.strip(), condition.strip(), **kw)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def condition(self):
+        return self._condition
+
+    @property
+    def clear(self):
+        """Clear condition as given, None if not given"""
+        return self._clear
+
+    @property
+    def hysteresis(self):
+        return self._hysteresis
+
+    @property
+    def delay(self):
+        return self._delay
+
+    @property
+    def clear_delay(self):
+        return self._clear_delay
+
+    @property
+    def devices(self):
+        return self._devices
+
+    @property
+    def windows(self):
+        """Set of (channel, window) the rule needs rates of"""
+        return self._windows
+
+    def applies(self, device):
+        return self._devices is None or device in self._devices
+
+    def __repr__(self):
+        return 'Rule(%r, %r)' % (self._name, self._condition)
+
+    @staticmethod
+    def _clear_condition(condition, hysteresis):
+        tree = ast.parse(condition.strip(), mode='eval')
+        compare = tree.body
+        if not isinstance(compare, ast.Compare) or len(compare.ops) != 1:
+            raise ValueError("hysteresis needs a single comparison, not %r" % condition)
+        left, op, right = compare.left, compare.ops[0], compare.comparators[0]
+        if isinstance(op, (ast.Gt, ast.GtE)):
+            compare = ast.Compare(left, [ast.Lt()], [ast.BinOp(right, ast.Sub(), _constant(hysteresis))])
+        elif isinstance(op, (ast.Lt, ast.LtE)):
+            compare = ast.Compare(left, [ast.Gt()], [ast.BinOp(right, ast.Add(), _constant(hysteresis))])
+        else:
+            raise ValueError("hysteresis needs <, <=, > or >=, not %r" % condition)
+        return ast.fix_missing_locations(ast.Expression(body=compare))
+
+
+class _Device(object):
+    """Rules and their state for a single device"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.state = [[False, 0] for _ in rules]  # active, consecutive samples
+        self.failed = set()
+        self.timeline = Timeline()
+        windows = collections.defaultdict(set)
+        for rule in rules:
+            for channel, window in rule.windows:
+                windows[channel].add(window)
+        self.stats = [(channel, RunningStats(sorted(w))) for channel, w in windows.items()]
+        self.rates = {}
+
+
+def _sample_rates(device, seconds, sample):
+    rates = device.rates
+    for channel, stats in device.stats:
+        stats.add(seconds, getattr(sample, channel))
+        for window in stats.windows:
+            rate = stats.rate(window)
+            rates[(channel, window)] = _nan if rate is None else rate
+    return rates
+
+
+class AlarmEngine(object):
+    """Evaluates alarm rules (see Rule) on samples of one or more devices.
+
+    Samples are fed with feed(), or the engine is attached to the
+    SampleBus of a device (attach()), so that rules are evaluated in a
+    separate thread and never delay the acquisition. Each change of a
+    rule's state (AlarmEvent) is passed to all actions, callables called
+    as action(event) from the evaluating thread; use CommandAction to run
+    a program, or post the event to the GUI thread (see ui.EventQueue)."""
+
+    def __init__(self, rules=(), actions=()):
+        self._lock = threading.RLock()
+        self._rules = list(rules)
+        self._actions = list(actions)
+        self._devices = {}
+        self._subscribers = []
+
+    @property
+    def rules(self):
+        return tuple(self._rules)
+
+    @property
+    def actions(self):
+        return tuple(self._actions)
+
+    def add_rule(self, rule):
+        """Add rule, it applies to samples fed from now on (state of all
+        rules starts over)"""
+        with self._lock:
+            self._rules.append(rule)
+            self._devices = {}  # recompile state
+
+    def add_action(self, action):
+        with self._lock:
+            self._actions.append(action)
+
+    def active(self):
+        """Returns list of (device, rule name) of raised alarms"""
+        with self._lock:
+            return [(name, rule.name) for name, device in self._devices.items()
+                    for rule, (active, _) in zip(device.rules, device.state) if active]
+
+    def feed(self, sample, device=None):
+        """Evaluate rules on sample of device. Returns list of AlarmEvent,
+        which are also passed to actions"""
+        with self._lock:
+            state = self._devices.get(device)
+            if state is None:
+                state = self._devices[device] = _Device([r for r in self._rules if r.applies(device)])
+            events = self._evaluate(state, sample, device)
+            actions = self._actions
+        for event in events:
+            for action in actions:
+                try:
+                    action(event)
+                except Exception as e:
+                    sys.stderr.write("warning: alarm action %r failed: %s\n" % (action, e))
+        return events
+
+    def attach(self, bus, device=None, maxsize=1024):
+        """Evaluate rules on samples published to bus (by device) in a
+        background thread. Returns the started Subscriber"""
+        subscriber = Subscriber(bus.subscribe(maxsize), lambda sample: self.feed(sample, device))
+        with self._lock:
+            self._subscribers.append(subscriber)
+        subscriber.start()
+        return subscriber
+
+    def close(self):
+        """Stop evaluating samples of attached buses"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.stop()
+        for subscriber in subscribers:
+            subscriber.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _evaluate(self, device, sample, name):
+        seconds = device.timeline.unwrap(sample.seconds)
+        t1, t2 = sample.t1, sample.t2
+        rates = _sample_rates(device, seconds, sample) if device.stats else None
+        events = []
+        for rule, state in zip(device.rules, device.state):
+            active = state[0]
+            try:
+                hit = (rule._reset if active else rule._test)(t1, t2, rates)
+            except (ArithmeticError, TypeError) as e:
+                if rule.name not in device.failed:
+                    device.failed.add(rule.name)
+                    sys.stderr.write("warning: rule %s: %s\n" % (rule.name, e))
+                hit = False
+            if not hit:
+                state[1] = 0
+                continue
+            state[1] += 1
+            if state[1] >= (rule.clear_delay if active else rule.delay):
+                state[0], state[1] = not active, 0
+                events.append(AlarmEvent(rule.name, name, CLEARED if active else RAISED, seconds, sample))
+        return events
+
+
+class CommandAction(object):
+    """Alarm action running command (a shell command line, or a list of
+    arguments with shell=False) for each event, without waiting for it.
+
+    The event is passed in environment variables CHY506R_ALARM_RULE,
+    CHY506R_ALARM_DEVICE, CHY506R_ALARM_STATE, CHY506R_ALARM_TIME (device
+    clock HH:MM:SS), CHY506R_ALARM_T1 and CHY506R_ALARM_T2."""
+
+    def __init__(self, command, shell=True):
+        self._command = command
+        self._shell = shell
+        self._processes = []
+
+    def __call__(self, event):
+        self._processes = [p for p in self._processes if p.poll() is None]  # reap
+        env = dict(os.environ)
+        env.update({
+            'CHY506R_ALARM_RULE': event.rule,
+            'CHY506R_ALARM_DEVICE': '' if event.device is None else str(event.device),
+            'CHY506R_ALARM_STATE': event.state,
+            'CHY506R_ALARM_TIME': '%02d:%02d:%02d' % event.sample.time,
+            'CHY506R_ALARM_T1': '%f' % event.sample.t1,
+            'CHY506R_ALARM_T2': '%f' % event.sample.t2,
+        })
+        self._processes.append(subprocess.Popen(self._command, shell=self._shell, env=env))
+
+    def __repr__(self):
+        return 'CommandAction(%r)' % (self._command, )
+
+
+def load_rules(path):
+    """Load rules from file, one per line (see Rule.parse()); empty lines
+    and lines starting with # are ignored"""
+    rules = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    rules.append(Rule.parse(line))
+                except ValueError as e:
+                    raise ValueError("%s:%d: %s" % (path, number, e))
+    return rules
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,133 @@
+# -*- coding: utf8 -*-
+
+import mmap
+import os
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .sample_ import Timeline
+from .writer_ import Writer
+
+__all__ = ('BinaryWriter', 'BinaryLog')
+
+
+MAGIC = b'CHY506RB'
+VERSION = 1
+_header = struct.Struct('<8sHH20x')  # magic, version, record size; 32 bytes
+_record = struct.Struct('<Idd8sH')   # time, t1, t2, status, count
+
+# NumPy view of a record, must match _record
+DTYPE = [('time', '<u4'), ('t1', '<f8'), ('t2', '<f8'), ('status', 'S8'), ('count', '<u2')]
+FIELDS = tuple(name for name, _ in DTYPE)
+
+
+class BinaryWriter(Writer):
+    """Writes samples as fixed-width binary records.
+
+    The file starts with a 32-byte header followed by records of time
+    (uint32, seconds since midnight of the first day, so it does not wrap
+    at midnight), t1, t2 (float64), status (8 bytes) and count (uint16).
+    Records are only ever appended; see BinaryLog for reading."""
+
+    _mode = 'wb'
+
+    @classmethod
+    def _stdout(cls):
+        return sys.stdout.buffer
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._timeline = Timeline()
+
+    def _header(self):
+        return _header.pack(MAGIC, VERSION, _record.size)
+
+    def _format(self, sample):
+        status = (sample.status or '').encode('ascii', 'replace')
+        return _record.pack(self._timeline.unwrap(sample.seconds), sample.t1, sample.t2,
+                            status, min(sample.count, 0xffff))
+
+    def _join(self, records):
+        return b''.join(records)
+
+
+class BinaryLog(object):
+    """Memory-mapped reader of files written by BinaryWriter.
+
+    With NumPy, records are exposed as a structured array backed directly by
+    the mapped file, and columns (log.t1, log['time'], ...) are zero-copy
+    views of it. Without NumPy columns are decoded into lists. A trailing
+    incomplete record (e.g. from a file still being written) is ignored."""
+
+    def __init__(self, path):
+        self._path = path
+        self._file = open(path, 'rb')
+        self._mmap = None
+        head = self._file.read(_header.size)
+        if len(head) < _header.size or _header.unpack(head) != (MAGIC, VERSION, _record.size):
+            self._file.close()
+            raise ValueError("%s is not a CHY506R binary log" % repr(path))
+        size = os.fstat(self._file.fileno()).st_size
+        self._length = (size - _header.size) // _record.size
+        if self._length:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._records = self._load()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def records(self):
+        """All records (NumPy structured array or list of tuples)"""
+        return self._records
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, field):
+        if numpy is not None:
+            return self._records[field]
+        return [r[FIELDS.index(field)] for r in self._records]
+
+    def __getattr__(self, field):
+        if field in FIELDS:
+            return self[field]
+        raise AttributeError(field)
+
+    def close(self):
+        self._records = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # columns still referenced, unmapped when released
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load(self):
+        if numpy is not None:
+            if not self._length:
+                return numpy.zeros(0, dtype=DTYPE)
+            return numpy.frombuffer(self._mmap, dtype=DTYPE, count=self._length,
+                                    offset=_header.size)
+        if not self._length:
+            return []
+        end = _header.size + self._length * _record.size
+        return list(_record.iter_unpack(self._mmap[_header.size:end]))
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
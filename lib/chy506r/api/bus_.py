@@ -0,0 +1,233 @@
+# -*- coding: utf8 -*-
+
+import collections
+import threading
+import time
+
+__all__ = ('SampleBus', 'Subscription', 'Subscriber', 'BusWriter')
+
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+COALESCE = 'coalesce'
+
+OVERFLOW = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+class Subscription(object):
+    """Bounded queue of samples published to a SampleBus for one subscriber.
+
+    When the queue is full, overflow decides what happens to a new sample:
+    'block' makes the publisher wait (at most timeout seconds, then the
+    sample is dropped), 'drop-oldest' discards the oldest queued sample and
+    'coalesce' replaces all queued samples with the new one, so the
+    subscriber catches up with the most recent state. Discarded samples are
+    counted in dropped."""
+
+    def __init__(self, bus, maxsize=1024, overflow=DROP_OLDEST, timeout=None):
+        if overflow not in OVERFLOW:
+            raise ValueError("overflow must be one of %s, not %r" % (', '.join(OVERFLOW), overflow))
+        self._bus = bus
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._timeout = timeout
+        self._queue = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._dropped = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def overflow(self):
+        return self._overflow
+
+    @property
+    def dropped(self):
+        """Number of samples discarded on overflow"""
+        return self._dropped
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, sample):
+        """Queue a sample (called by the bus). Returns False if it was
+        dropped"""
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self._maxsize:
+                if self._overflow == DROP_OLDEST:
+                    self._queue.popleft()
+                    self._dropped += 1
+                elif self._overflow == COALESCE:
+                    self._dropped += len(self._queue)
+                    self._queue.clear()
+                elif not self._wait_space():
+                    self._dropped += 1
+                    return False
+            self._queue.append(sample)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Return next sample, waiting at most timeout seconds (forever if
+        None). Returns None on timeout or when the subscription is closed
+        and empty"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self._closed, timeout):
+                return None
+            if not self._queue:
+                return None
+            sample = self._queue.popleft()
+            self._cond.notify_all()
+            return sample
+
+    def get_all(self):
+        """Return all queued samples without waiting"""
+        with self._cond:
+            samples = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+            return samples
+
+    def close(self):
+        """Unsubscribe; queued samples can still be read"""
+        self._bus.unsubscribe(self)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __iter__(self):
+        """Iterate over samples until the subscription is closed"""
+        while True:
+            sample = self.get()
+            if sample is None:
+                return
+            yield sample
+
+    def _wait_space(self):
+        if self._timeout is None:
+            self._cond.wait_for(lambda: len(self._queue) < self._maxsize or self._closed)
+        else:
+            deadline = time.monotonic() + self._timeout
+            while len(self._queue) >= self._maxsize and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+        return len(self._queue) < self._maxsize and not self._closed
+
+
+class SampleBus(object):
+    """Distributes samples published by the acquisition to any number of
+    subscribers, each reading from its own bounded queue (see Subscription).
+
+    Publishing never waits for subscribers, unless one of them has asked for
+    the 'block' overflow policy."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._subscriptions = ()
+        self._published = 0
+
+    @property
+    def subscriptions(self):
+        return self._subscriptions
+
+    @property
+    def published(self):
+        """Number of samples published so far"""
+        return self._published
+
+    def subscribe(self, maxsize=1024, overflow=DROP_OLDEST, timeout=None):
+        """Returns new Subscription receiving samples published from now on"""
+        subscription = Subscription(self, maxsize, overflow, timeout)
+        with self._lock:
+            self._subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+
+    def publish(self, sample):
+        """Pass sample to all subscribers"""
+        self._published += 1
+        for subscription in self._subscriptions:  # immutable snapshot
+            subscription.put(sample)
+
+    def close(self):
+        """Close all subscriptions, so their consumers finish"""
+        for subscription in self._subscriptions:
+            subscription.close()
+
+
+class Subscriber(threading.Thread):
+    """Thread consuming a subscription: calls callback(sample) for each
+    sample until the subscription gets closed"""
+
+    def __init__(self, subscription, callback):
+        super().__init__(daemon=True)
+        self._subscription = subscription
+        self._callback = callback
+
+    @property
+    def subscription(self):
+        return self._subscription
+
+    def stop(self):
+        self._subscription.close()
+
+    def run(self):
+        for sample in self._subscription:
+            self._callback(sample)
+
+
+class BusWriter(object):
+    """Writer publishing samples to a SampleBus, so that the bus can be fed
+    alongside files (e.g. within TeeWriter). If close is True, closing the
+    writer closes the bus too."""
+
+    pending = 0
+
+    def __init__(self, bus, close=False):
+        self._bus = bus
+        self._close = close
+
+    @property
+    def bus(self):
+        return self._bus
+
+    def begin(self):
+        pass
+
+    def write(self, sample):
+        self._bus.publish(sample)
+
+    def tick(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._close:
+            self._bus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
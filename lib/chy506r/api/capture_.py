@@ -0,0 +1,137 @@
+# -*- coding: utf8 -*-
+
+import struct
+import time
+
+__all__ = ('CaptureWriter', 'read_capture', 'ReplaySource')
+
+
+MAGIC = b'CHY506RC'
+VERSION = 1
+_header = struct.Struct('<8sH')
+_record = struct.Struct('<dH')  # host monotonic receive time, data length
+
+
+class CaptureWriter(object):
+    """Writes raw bytes received from the device, each chunk stamped with
+    host monotonic receive time, to a capture file"""
+
+    def __init__(self, path):
+        self._path = path
+        self._file = open(path, 'wb')
+        self._file.write(_header.pack(MAGIC, VERSION))
+
+    @property
+    def path(self):
+        """Path to the capture file"""
+        return self._path
+
+    def write(self, data, stamp=None):
+        """Append chunk of received data to the capture"""
+        if stamp is None:
+            stamp = time.monotonic()
+        for i in range(0, len(data), 0xffff):
+            chunk = data[i:i+0xffff]
+            self._file.write(_record.pack(stamp, len(chunk)))
+            self._file.write(chunk)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_capture(path):
+    """Iterate over a capture file yielding (stamp, data) tuples"""
+    with open(path, 'rb') as f:
+        head = f.read(_header.size)
+        if len(head) < _header.size or _header.unpack(head) != (MAGIC, VERSION):
+            raise ValueError("%s is not a CHY506R capture file" % repr(path))
+        while True:
+            head = f.read(_record.size)
+            if len(head) < _record.size:
+                return
+            stamp, length = _record.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return  # truncated capture (e.g. writer killed)
+            yield (stamp, data)
+
+
+class ReplaySource(object):
+    """Serial port replacement feeding data from a capture file.
+
+    Data is delivered with original timing scaled by speed (speed=2 replays
+    twice as fast); speed=None replays as fast as possible. Can be passed
+    to Chy506R in place of TTY path."""
+
+    def __init__(self, path, speed=1.0):
+        self._path = path
+        self._speed = speed
+        self._records = read_capture(path)
+        self._pending = b''
+        self._origin = None
+        self._eof = False
+
+    @property
+    def path(self):
+        """Path to the capture file"""
+        return self._path
+
+    @property
+    def eof(self):
+        """Whether the whole capture has been replayed"""
+        return self._eof and not self._pending
+
+    @property
+    def in_waiting(self):
+        return len(self._pending)
+
+    def read(self, size=1):
+        """Return up to size bytes, waiting for the next captured chunk if
+        needed. Returns empty bytes at the end of capture."""
+        if not self._pending:
+            self._next()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def write(self, data):
+        """Commands sent to the device are ignored"""
+        return len(data)
+
+    def close(self):
+        self._records.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _next(self):
+        try:
+            stamp, data = next(self._records)
+        except StopIteration:
+            self._eof = True
+            return
+        if self._speed:
+            now = time.monotonic()
+            if self._origin is None:
+                self._origin = (stamp, now)
+            due = self._origin[1] + (stamp - self._origin[0]) / self._speed
+            if due > now:
+                time.sleep(due - now)
+        self._pending = data
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -1,20 +1,266 @@
 # -*- coding: utf8 -*-
 
+import collections
+import os
 import serial
 import sys
 import threading
+import time
 
-__all__ = ('Chy506R', )
+from .binlog_ import BinaryWriter
+from .bus_ import BusWriter
+from .capture_ import CaptureWriter
+from .framer_ import Framer, _protocol_error
+from .metrics_ import Metrics
+from .parser_ import parse_frames
+from .rollup_ import RollupWriter, TIERS
+from .sample_ import Sample
+from .sqlite_ import SqliteWriter
+from .stats_ import LiveStatistics
+from .trace_ import Trace
+from .writer_ import CsvWriter, TeeWriter
+
+__all__ = ('Chy506R', 'Recorder', 'open_tty', 'open_output', 'device_metrics')
+
+
+START_COMMAND = "A\n".encode()
+STOP_COMMAND = "B\n".encode()
+
+
+def open_tty(tty, timeout=4):
+    """Open serial port connected to CHY506R and return its descriptor"""
+    setup = {
+        'baudrate': 1200,
+        'bytesize': serial.SEVENBITS,
+        'parity': serial.PARITY_EVEN,
+        'stopbits': serial.STOPBITS_ONE,
+        'timeout': timeout,
+    }
+    return serial.Serial(tty, **setup)
+
+
+# Output format by file extension, CSV for others
+_writers = {
+    '.bin': BinaryWriter,
+    '.db': SqliteWriter,
+    '.sqlite': SqliteWriter,
+    '.sqlite3': SqliteWriter,
+}
+
+
+def open_output(output, flush=None, rollups=None, device=None):
+    """Open output file(s) and return a writer.
+
+    The output is a path (or a list of paths, to write several files at
+    once); file format is selected by extension. If rollups is given (True
+    for default tiers, or a sequence of tier widths in seconds), rolled-up
+    tiers are maintained next to the (first) output, see RollupWriter.
+    The device (TTY name) labels sessions recorded into databases."""
+    if rollups:
+        first = output if isinstance(output, str) else output[0]
+        tiers = TIERS if rollups is True else rollups
+        return TeeWriter([open_output(output, flush, device=device), RollupWriter(first, tiers, flush)])
+    if not isinstance(output, str):
+        return TeeWriter(open_output(path, flush, device=device) for path in output)
+    ext = os.path.splitext(output)[1].lower()
+    writer = _writers.get(ext, CsvWriter)
+    if writer is SqliteWriter:
+        return writer.open(output, flush, device)
+    return writer.open(output, flush)
+
+
+def device_metrics(labels=None):
+    """Returns Metrics registry with metrics of device acquisition, as
+    maintained by Recorder and Chy506R"""
+    metrics = Metrics(labels)
+    metrics.counter('bytes_read_total', "Bytes received from the device")
+    metrics.counter('frames_total', "Frames received from the device")
+    metrics.counter('protocol_errors_total', "Invalid frames and garbage received")
+    metrics.counter('samples_total', "Samples written")
+    metrics.histogram('frames_per_sample', "Frames averaged into one sample",
+                      (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 60))
+    metrics.histogram('read_seconds', "Time spent reading the TTY, including waiting for data")
+    metrics.histogram('parse_seconds', "Time spent parsing frames")
+    metrics.histogram('write_seconds', "Time spent formatting and writing samples")
+    metrics.histogram('flush_seconds', "Duration of writes flushing buffered samples")
+    metrics.gauge('writer_pending', "Samples buffered, not yet written to disk")
+    return metrics
+
+
+class Recorder(object):
+    """Per-device acquisition policy.
+
+    Parses frames received from the device, averages measurements collected
+    at same time (H:M:S) and passes averaged samples to the writer.
+    Statistics are maintained in metrics (see device_metrics()). If tracer
+    (a Tracer) is given, samples carry their Trace and are added to it once
+    the writer flushed them. If stats (LiveStatistics) is given, it is
+    updated with every sample."""
+
+    def __init__(self, writer, metrics=None, tracer=None, stats=None):
+        self._writer = writer
+        self._last = (0, 0, -1)
+        self._buff = []  # multiple measurements at same time (H:M:S) get collected here
+        self._status = None
+        self._count = 0
+        self._metrics = metrics or device_metrics()
+        self._frames = self._metrics['frames_total']
+        self._errors = self._metrics['protocol_errors_total']
+        self._samples = self._metrics['samples_total']
+        self._frames_per_sample = self._metrics['frames_per_sample']
+        self._parse_time = self._metrics['parse_seconds']
+        self._write_time = self._metrics['write_seconds']
+        self._flush_time = self._metrics['flush_seconds']
+        self._pending = self._metrics['writer_pending']
+        self._tracer = tracer
+        self._stats = stats
+        self._arrival = None  # of frames being fed
+        self._parsed = None
+        self._first_arrival = self._last_arrival = None  # of frames in buff
+        self._unflushed = collections.deque()  # traced samples buffered by the writer
+
+    @property
+    def count(self):
+        """Number of entries written to the output file"""
+        return self._count
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def protocol_error(self, data):
+        """Framer's onerror callback, counts and reports garbage received"""
+        self._errors.inc()
+        _protocol_error(data)
+
+    def tick(self):
+        """Let the writer flush if required by its policy"""
+        self._timed(0, self._writer.tick)
+
+    def begin(self):
+        """Write output file header"""
+        self._writer.begin()
+
+    def flush(self):
+        """Flush samples buffered by the writer"""
+        self._timed(0, self._writer.flush)
+
+    def feed(self, frames, arrival=None):
+        """Process frames received from the device (as extracted by Framer)
+        at arrival (time.monotonic(), for tracing).
+
+        Returns number of new samples written to the output."""
+        if not frames:
+            return 0
+        with self._parse_time.time():
+            parsed = parse_frames(b''.join(frames))
+        if self._tracer is not None:
+            self._arrival = arrival
+            self._parsed = time.monotonic()
+        self._frames.inc(len(frames))
+        if not all(parsed.valid):
+            for frame, valid in zip(frames, parsed.valid):
+                if not valid:
+                    self._errors.inc()
+                    sys.stderr.write("warning: invalid frame: %s\n" % repr(bytes(frame)))
+        written = 0
+        for t1, t2, hms, status in parsed.rows():
+            written += self._add(t1, t2, hms, status)
+        return written
+
+    def _add(self, t1, t2, hms, status):
+        written = 0
+        if self._last < hms:
+            self._last = hms
+            if self._buff:
+                written = self._write(hms, self._average_buff(self._buff))
+                self._buff = []
+            self._first_arrival = self._arrival
+        self._buff.append((t1, t2))
+        self._last_arrival = self._arrival
+        self._status = status
+        return written
+
+    def _write(self, hms, means):
+        m1, m2 = means
+        trace = None
+        if self._tracer is not None:
+            trace = Trace(self._first_arrival, self._last_arrival, self._arrival, self._parsed)
+        sample = Sample(hms, m1, m2, self._status, len(self._buff), trace)
+        if trace is not None:
+            self._unflushed.append(sample)
+        self._write_time.observe(self._timed(1, self._writer.write, sample))
+        if self._stats is not None:
+            self._stats.add(sample)
+        self._frames_per_sample.observe(sample.count)
+        self._samples.inc()
+        self._count += 1
+        return 1
+
+    def _timed(self, added, func, *args):
+        """Call writer's func adding added records, observe its duration as
+        flush latency if the writer flushed. Returns duration"""
+        pending = self._writer.pending + added
+        start = time.perf_counter()
+        func(*args)
+        duration = time.perf_counter() - start
+        if self._writer.pending < pending:
+            self._flush_time.observe(duration)
+        self._pending.set(self._writer.pending)
+        if len(self._unflushed) > self._writer.pending:
+            self._stamp_written()
+        return duration
+
+    def _stamp_written(self):
+        # all but the last pending samples are out of the writer's buffer
+        now = time.monotonic()
+        while len(self._unflushed) > self._writer.pending:
+            sample = self._unflushed.popleft()
+            sample.trace.written = now
+            self._tracer.add(sample)
+
+    def _average_buff(self, buff):
+        return tuple(sum(s)/len(buff) for s in zip(*buff))
 
 
 class Chy506R(threading.Thread):
-    def __init__(self, tty, output, timeout=4):
+    """Reads measurements from CHY506R connected to tty and writes them to
+    output file.
+
+    The tty may be a path to serial port or a serial-like object (such as
+    ReplaySource). If capture is given, raw bytes received from the device
+    are additionally recorded to that capture file. The flush argument is a
+    FlushPolicy deciding when samples get written to disk (by default after
+    every sample). See open_output() for supported outputs and rollups.
+    If bus (a SampleBus) is given, samples are also published to it, so
+    live consumers don't need to read the output file.
+
+    If listener is given, it gets called from the acquisition thread as
+    listener(event, data) on state changes: ('started', None), ('sample',
+    count), ('error', message) and finally ('stopped', done).
+
+    Runtime statistics (frames read, protocol errors, time spent reading,
+    parsing and writing, ...) are maintained in metrics, see
+    device_metrics(). If tracer (a Tracer) is given, samples get traced
+    through the pipeline, see Trace. Running statistics of the measured
+    temperatures are available as snapshots (see stats)."""
+
+    def __init__(self, tty, output, timeout=4, capture=None, flush=None, rollups=None,
+                 listener=None, bus=None, tracer=None):
         super().__init__()
         self._lock = threading.RLock()
         with self._lock:
             self._tty = tty
             self._output = output
             self._timeout = timeout
+            self._capture = capture
+            self._flush = flush
+            self._rollups = rollups
+            self._listener = listener
+            self._bus = bus
+            self._tracer = tracer
+            self._metrics = device_metrics({'device': tty if isinstance(tty, str) else repr(tty)})
+            self._stats = LiveStatistics()
             self._done = False
             self._break = False
             self._count = 0
@@ -29,84 +275,121 @@ class Chy506R(threading.Thread):
         """Number of entries written to the output file"""
         return self._count
 
+    @property
+    def stats(self):
+        """Running statistics of the current measurements (StatsSnapshot)"""
+        return self._stats.snapshot()
+
+    @property
+    def metrics(self):
+        """Metrics registry of the device"""
+        return self._metrics
+
+    @property
+    def tracer(self):
+        """Tracer of samples, or None"""
+        return self._tracer
+
+    @property
+    def bus(self):
+        """SampleBus the samples are published to, or None"""
+        return self._bus
+
     def open_tty(self):
         """Open TTY (self._tty) and return its descriptor"""
         with self._lock:
-            setup = {
-                'baudrate': 1200,
-                'bytesize': serial.SEVENBITS,
-                'parity': serial.PARITY_EVEN,
-                'stopbits': serial.STOPBITS_ONE,
-                'timeout': self._timeout,
-            }
-            return serial.Serial(self._tty, **setup)
+            if not isinstance(self._tty, str):
+                return self._tty
+            return open_tty(self._tty, self._timeout)
+
+    def open_capture(self):
+        """Open capture file (self._capture) and return CaptureWriter or None
+        if capturing is disabled"""
+        with self._lock:
+            if self._capture is None:
+                return None
+            return CaptureWriter(self._capture)
 
     def open_output(self):
-        """Open output file (self._output) and return its descriptor"""
+        """Open output file (self._output) and return its writer"""
         with self._lock:
-            if self._output == '-':
-                return sys.stdout
-            else:
-                return open(self._output, 'wt')
+            device = self._tty if isinstance(self._tty, str) else getattr(self._tty, 'path', None)
+            out = open_output(self._output, self._flush, self._rollups, device)
+            if self._bus is not None:
+                out = TeeWriter([out, BusWriter(self._bus)])
+            return out
 
     def stop(self):
         """Stop iteration/finish measurements"""
         with self._lock:
             self._break = True
 
-    def _parse_temperature(self, s, i):
-        off = 0 if i==1 else 8
-        return (-1 if s[off] == '-' else 1) * int(s[1+off:7+off], 16)/1000
-
-    def _parse_timestamp(self, s):
-        return (int(s[16:18]), int(s[18:20]), int(s[20:22]))
-
-    def _parse_status(self, s):
-        return s[22:]
-
-    def _average_buff(self, buff):
-        return tuple(sum(s)/len(buff) for s in zip(*buff))
+    def _notify(self, event, data=None):
+        if self._listener is not None:
+            self._listener(event, data)
 
     def run(self):
-        last = (0, 0, -1)
-        buff = []  # multiple measurements at same time (H:M:S) get collected here
+        try:
+            self._run()
+        except Exception as e:
+            self._notify('error', str(e))
+            raise
+        finally:
+            self._notify('stopped', self._done)
+
+    def _run(self):
         with self.open_output() as out, self.open_tty() as tty:
-            tty.write("A\n".encode())
+            capture = self.open_capture()
+            tty.write(START_COMMAND)
             try:
                 with self._lock:
                     self._break = False
                     self._done = False
                     self._count = 0
-                out.write("TIME;T1;T2\n")
-                for line in tty:
-                    l = line.strip()
-                    if len(l) != 30:
-                        sys.stderr.write("warning: protocol error: %s (len = %d)\n" % (repr(l), len(l)))
-                        continue  # I've seen, some lines can be broken
-                    t1 = self._parse_temperature(l, 1)
-                    t2 = self._parse_temperature(l, 2)
-                    h, m, s = self._parse_timestamp(l)
-                    status = self._parse_status(l)
-                    if last < (h, m, s):
-                        last = (h, m, s)
-                        if buff:
-                            m1, m2 = self._average_buff(buff)
-                            buff = []
-                            out.write("%02d:%02d:%02d;%f;%f\n" % (h, m, s, m1, m2))
-                            out.flush()
-                            with self._lock:
-                                self._count += 1
-                    buff.append((t1, t2))
+                    self._stats = LiveStatistics()
+                recorder = Recorder(out, self._metrics, self._tracer, self._stats)
+                recorder.begin()
+                framer = Framer(recorder.protocol_error)
+                read_time = self._metrics['read_seconds']
+                bytes_read = self._metrics['bytes_read_total']
+                self._notify('started')
+                while True:
+                    try:
+                        with read_time.time():
+                            data = tty.read(max(tty.in_waiting, 1))
+                    except serial.SerialException as e:
+                        sys.stderr.write("warning: %s\n" % e)
+                        self._notify('error', str(e))
+                        break
+                    if not data:
+                        if getattr(tty, 'eof', False):
+                            self._done = True  # replay finished
+                        break  # timeout
+                    bytes_read.inc(len(data))
+                    arrival = time.monotonic()
+                    if capture is not None:
+                        capture.write(data, arrival)
+                    if recorder.feed(framer.feed(data), arrival):
+                        with self._lock:
+                            self._count = recorder.count
+                        self._notify('sample', recorder.count)
+                    recorder.tick()
                     with self._lock:
                         if self._break:
                             self._done = True
                             break
+                recorder.flush()
                 if not self._done:
                     sys.stderr.write("warning: communication aborted, is the device connected to PC?\n")
             except KeyboardInterrupt:
                 pass
             finally:
-                tty.write("B\n".encode())
+                try:
+                    tty.write(STOP_COMMAND)
+                except serial.SerialException:
+                    pass  # device disconnected
+                if capture is not None:
+                    capture.close()
 
 # Local Variables:
 # # tab-width:4
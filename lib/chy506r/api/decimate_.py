@@ -0,0 +1,108 @@
+# -*- coding: utf8 -*-
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+__all__ = ('minmax', 'lttb', 'decimate')
+
+
+def minmax(x, y, points):
+    """Reduce series (x sorted ascending) to at most points points.
+
+    The x range is split into points/2 equal buckets (like pixels on the
+    screen) and the minimum and maximum of each bucket are kept, in x
+    order, so peaks are preserved. Returns (x, y) lists or arrays."""
+    if len(x) <= points:
+        return x, y
+    buckets = max(points // 2, 1)
+    if numpy is not None:
+        return _minmax_numpy(numpy.asarray(x), numpy.asarray(y), buckets)
+    return _minmax_python(x, y, buckets)
+
+
+def _bucket_width(x0, x1, buckets):
+    return float(x1 - x0) / buckets or 1.0
+
+
+def _minmax_numpy(x, y, buckets):
+    width = _bucket_width(x[0], x[-1], buckets)
+    b = numpy.minimum(((x - x[0]) / width).astype(numpy.int64), buckets - 1)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(b)) + 1))
+    lengths = numpy.diff(numpy.concatenate((starts, [len(x)])))
+    index = numpy.arange(len(x))
+    keep = []
+    for reduce in (numpy.minimum, numpy.maximum):
+        extreme = numpy.repeat(reduce.reduceat(y, starts), lengths)
+        # first index of the extreme value within each bucket
+        keep.append(numpy.minimum.reduceat(numpy.where(y == extreme, index, len(x)), starts))
+    keep = numpy.unique(numpy.concatenate(keep))
+    return x[keep], y[keep]
+
+
+def _minmax_python(x, y, buckets):
+    width = _bucket_width(x[0], x[-1], buckets)
+    keep = []
+    lo = hi = None
+    current = None
+    for i, xi in enumerate(x):
+        b = min(int((xi - x[0]) / width), buckets - 1)
+        if b != current:
+            if current is not None:
+                keep.extend(sorted({lo, hi}))
+            current, lo, hi = b, i, i
+        elif y[i] < y[lo]:
+            lo = i
+        elif y[i] > y[hi]:
+            hi = i
+    keep.extend(sorted({lo, hi}))
+    return [x[i] for i in keep], [y[i] for i in keep]
+
+
+def lttb(x, y, points):
+    """Reduce series to points points with the Largest-Triangle-Three-Buckets
+    algorithm (keeps the visual shape, first and last points retained).
+    Returns (x, y) lists or arrays."""
+    n = len(x)
+    if n <= points or points < 3:
+        return x, y
+    every = float(n - 2) / (points - 2)
+    keep = [0]
+    a = 0
+    if numpy is not None:
+        x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+    for i in range(points - 2):
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        nstart, nstop = stop, min(int((i + 2) * every) + 1, n)
+        if numpy is not None:
+            cx, cy = x[nstart:nstop].mean(), y[nstart:nstop].mean()
+            area = numpy.abs((x[a] - cx) * (y[start:stop] - y[a]) -
+                             (x[a] - x[start:stop]) * (cy - y[a]))
+            a = start + int(area.argmax())
+        else:
+            count = nstop - nstart
+            cx, cy = sum(x[nstart:nstop]) / count, sum(y[nstart:nstop]) / count
+            a = max(range(start, stop), key=lambda j: abs(
+                (x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])))
+        keep.append(a)
+    keep.append(n - 1)
+    if numpy is not None:
+        return x[keep], y[keep]
+    return [x[i] for i in keep], [y[i] for i in keep]
+
+
+_methods = {'minmax': minmax, 'lttb': lttb}
+
+
+def decimate(x, ys, points, method='minmax'):
+    """Decimate several channels sharing the x axis. Returns list of
+    (x, y) pairs, one per channel in ys"""
+    func = _methods[method]
+    return [func(x, y, points) for y in ys]
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
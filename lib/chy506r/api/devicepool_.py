@@ -0,0 +1,283 @@
+# -*- coding: utf8 -*-
+
+import os
+import selectors
+import sys
+import threading
+import time
+
+from .bus_ import BusWriter
+from .capture_ import CaptureWriter
+from .chy506r_ import Recorder, device_metrics, open_output, open_tty, START_COMMAND, STOP_COMMAND
+from .stats_ import LiveStatistics
+from .framer_ import Framer
+from .writer_ import TeeWriter
+
+__all__ = ('DevicePool', )
+
+
+class PoolDevice(object):
+    """Single device handled by DevicePool.
+
+    Arguments have the same meaning as for Chy506R; the listener gets
+    called from the pool's thread."""
+
+    def __init__(self, tty, output, capture=None, flush=None, rollups=None, listener=None, bus=None,
+                 tracer=None):
+        self._tty = tty
+        self._output = output
+        self._capture = capture
+        self._flush = flush
+        self._rollups = rollups
+        self._listener = listener
+        self._bus = bus
+        self._tracer = tracer
+        self._port = None
+        self._out = None
+        self._capture_writer = None
+        self._recorder = None
+        self._metrics = device_metrics({'device': tty})
+        self._stats = LiveStatistics()
+        self._framer = None
+        self._last_seen = None
+        self._done = False
+
+    @property
+    def tty(self):
+        """Path to the TTY the device is connected to"""
+        return self._tty
+
+    @property
+    def output(self):
+        """Path to the output file"""
+        return self._output
+
+    @property
+    def done(self):
+        """Whether measurements are done as user requested"""
+        return self._done
+
+    @property
+    def count(self):
+        """Number of entries written to the output file"""
+        return 0 if self._recorder is None else self._recorder.count
+
+    @property
+    def metrics(self):
+        """Metrics registry of the device"""
+        return self._metrics
+
+    @property
+    def stats(self):
+        """Running statistics of the measurements (StatsSnapshot)"""
+        return self._stats.snapshot()
+
+    @property
+    def tracer(self):
+        """Tracer of samples, or None"""
+        return self._tracer
+
+    @property
+    def bus(self):
+        """SampleBus the samples are published to, or None"""
+        return self._bus
+
+    def open_output(self):
+        """Open output file (self._output) and return its writer"""
+        out = open_output(self._output, self._flush, self._rollups, self._tty)
+        if self._bus is not None:
+            out = TeeWriter([out, BusWriter(self._bus)])
+        return out
+
+    def open(self):
+        """Open TTY and output file, send start command to the device"""
+        self._port = open_tty(self._tty, 0)  # non-blocking reads
+        self._out = None
+        try:
+            self._out = self.open_output()
+            if self._capture is not None:
+                self._capture_writer = CaptureWriter(self._capture)
+            self._recorder = Recorder(self._out, self._metrics, self._tracer, self._stats)
+            self._framer = Framer(self._recorder.protocol_error)
+            self._recorder.begin()
+            os.write(self._port.fileno(), START_COMMAND)
+        except BaseException:
+            self._port.close()
+            if self._out is not None:
+                self._out.close()
+            raise
+        self._last_seen = time.monotonic()
+        self._notify('started')
+
+    def fail(self, error):
+        """Report error which prevented the device from being opened"""
+        if self._listener is None:
+            sys.stderr.write("warning: %s: %s\n" % (self._tty, error))
+        self._notify('error', str(error))
+        self._notify('stopped', False)
+
+    def close(self, done=False):
+        """Send stop command to the device, close TTY and output file. The
+        done argument tells whether measurements finished as requested"""
+        self._done = done
+        try:
+            self._recorder.flush()
+            os.write(self._port.fileno(), STOP_COMMAND)
+        except OSError:
+            pass  # device disconnected
+        finally:
+            try:
+                self._port.close()
+                self._out.close()
+                if self._capture_writer is not None:
+                    self._capture_writer.close()
+            finally:
+                self._notify('stopped', done)
+
+    def tick(self):
+        """Let the writer flush if required by its policy"""
+        self._recorder.tick()
+
+    def fileno(self):
+        return self._port.fileno()
+
+    def receive(self, now):
+        """Read whatever is available on the TTY and feed complete frames
+        to the recorder"""
+        # pyserial's read()/write() use select.select(), which does not
+        # support descriptors above FD_SETSIZE, so the port's descriptor
+        # is used directly
+        try:
+            data = os.read(self._port.fileno(), 4096)
+        except OSError as e:
+            data = None
+            sys.stderr.write("warning: %s: %s\n" % (self._tty, e))
+        if not data:  # readable, but no data: device disconnected
+            self._last_seen = float('-inf')  # expire immediately
+            return
+        self._last_seen = now
+        self._metrics['bytes_read_total'].inc(len(data))
+        if self._capture_writer is not None:
+            self._capture_writer.write(data, now)
+        if self._recorder.feed(self._framer.feed(data), now):
+            self._notify('sample', self._recorder.count)
+        self._recorder.tick()
+
+    def expires(self, timeout):
+        """Returns the point in time (monotonic) when the device is
+        considered disconnected"""
+        return self._last_seen + timeout
+
+    def _notify(self, event, data=None):
+        if self._listener is not None:
+            self._listener(event, data)
+
+
+class DevicePool(threading.Thread):
+    """Handles multiple CHY506R devices in a single thread.
+
+    TTYs are multiplexed with selectors, so a single thread serves any
+    number of devices. Each device follows the same policy as Chy506R. A
+    device which can't be opened reports the error to its listener (or to
+    stderr) and the others carry on."""
+
+    def __init__(self, timeout=4, flush=None):
+        super().__init__()
+        self._lock = threading.RLock()
+        with self._lock:
+            self._timeout = timeout
+            self._flush = flush
+            self._devices = []
+            self._break = False
+            self._wakeup_r, self._wakeup_w = os.pipe()
+
+    @property
+    def devices(self):
+        """Devices added to the pool"""
+        with self._lock:
+            return tuple(self._devices)
+
+    @property
+    def done(self):
+        """Whether measurements are done as user requested"""
+        return all(device.done for device in self.devices)
+
+    @property
+    def count(self):
+        """Total number of entries written to output files"""
+        return sum(device.count for device in self.devices)
+
+    def add(self, tty, output, capture=None, rollups=None, listener=None, bus=None, tracer=None):
+        """Add device connected to tty, writing its samples to output and
+        optionally its raw data to capture file. See Chy506R for the other
+        arguments.
+
+        Devices must be added before the pool is started."""
+        device = PoolDevice(tty, output, capture, self._flush, rollups, listener, bus, tracer)
+        with self._lock:
+            self._devices.append(device)
+        return device
+
+    def stop(self):
+        """Stop iteration/finish measurements"""
+        with self._lock:
+            self._break = True
+            if self._wakeup_w is not None:
+                os.write(self._wakeup_w, b'\0')
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        active = []
+        done = False
+        try:
+            for device in self.devices:
+                try:
+                    device.open()
+                except Exception as e:
+                    device.fail(e)
+                    continue
+                selector.register(device, selectors.EVENT_READ, device)
+                active.append(device)
+            # silent devices get ticked every flush interval, so that their
+            # buffered samples get flushed anyway
+            interval = self._flush.interval if self._flush is not None else None
+            next_tick = None if interval is None else time.monotonic() + interval
+            while active:
+                deadline = min(device.expires(self._timeout) for device in active)
+                if next_tick is not None:
+                    deadline = min(deadline, next_tick)
+                events = selector.select(max(deadline - time.monotonic(), 0))
+                now = time.monotonic()
+                for key, _ in events:
+                    if key.data is not None:
+                        key.data.receive(now)
+                if next_tick is not None and now >= next_tick:
+                    for device in active:
+                        device.tick()
+                    next_tick = now + interval
+                with self._lock:
+                    if self._break:
+                        done = True
+                        break
+                for device in [d for d in active if d.expires(self._timeout) <= now]:
+                    sys.stderr.write("warning: communication with %s aborted, is the device connected to PC?\n" % device.tty)
+                    selector.unregister(device)
+                    active.remove(device)
+                    device.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for device in active:
+                device.close(done)
+            selector.close()
+            with self._lock:
+                os.close(self._wakeup_r)
+                os.close(self._wakeup_w)
+                self._wakeup_r = self._wakeup_w = None
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,79 @@
+# -*- coding: utf8 -*-
+
+import re
+import sys
+
+__all__ = ('Framer', )
+
+
+FRAME_LENGTH = 30
+FRAME_RE = re.compile(
+    br'[^\r\n][0-9A-Fa-f]{6}[^\r\n]{2}[0-9A-Fa-f]{6}[^\r\n][0-9]{6}[^\r\n]{8}'
+)
+
+
+def _protocol_error(data):
+    sys.stderr.write("warning: protocol error: %s (len = %d)\n" % (repr(data), len(data)))
+
+
+class Framer(object):
+    """Splits the byte stream received from CHY506R into frames.
+
+    Data may be fed in chunks of any size. Complete frames are returned as
+    memoryview slices of the received data. Lines which are not exactly one
+    frame long (broken frames, frames glued together after a lost line
+    terminator) are scanned for well formed frames, so the framer
+    resynchronizes mid-stream instead of throwing away the whole line."""
+
+    def __init__(self, onerror=_protocol_error):
+        self._onerror = onerror
+        self._pending = b''
+
+    @property
+    def pending(self):
+        """Number of received bytes not yet assembled into a frame"""
+        return len(self._pending)
+
+    def feed(self, data):
+        """Feed the framer with received bytes and return list of complete
+        frames (as memoryview objects)"""
+        chunk = self._pending + data
+        end = chunk.rfind(b'\n') + 1
+        self._pending = chunk[end:][-4*FRAME_LENGTH:]
+        view = memoryview(chunk)
+        frames = []
+        start = 0
+        while start < end:
+            stop = chunk.index(b'\n', start)
+            self._scan(chunk, view, start, stop, frames)
+            start = stop + 1
+        return frames
+
+    def _scan(self, chunk, view, start, stop, frames):
+        """Extract frames from a single line chunk[start:stop]"""
+        while start < stop and chunk[start] in b' \t\r':
+            start += 1
+        while stop > start and chunk[stop-1] in b' \t\r':
+            stop -= 1
+        if start == stop:
+            return
+        # Scan forward, so frames followed by garbage on the same line (lost
+        # or partial line terminator) are kept; only the gaps are errors.
+        pos = start
+        for match in FRAME_RE.finditer(chunk, start, stop):
+            self._gap(chunk, pos, match.start())
+            frames.append(view[match.start():match.end()])
+            pos = match.end()
+        self._gap(chunk, pos, stop)
+
+    def _gap(self, chunk, start, stop):
+        """Report chunk[start:stop] between frames unless it's just a stray
+        line terminator"""
+        if chunk[start:stop].strip(b' \t\r'):
+            self._onerror(chunk[start:stop])
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,160 @@
+# -*- coding: utf8 -*-
+
+import bisect
+
+from .sample_ import Timeline
+
+__all__ = ('IndexWriter', 'CsvIndex', 'index_path', 'build_index', 'read_range', 'parse_time')
+
+
+EVERY = 1000
+_magic = 'CHY506R-INDEX 1'
+
+
+def index_path(path):
+    """Returns path of the index sidecar of CSV file at path"""
+    return path + '.idx'
+
+
+def parse_time(value):
+    """Convert time given as seconds or 'HH:MM:SS' (first day) or
+    'D HH:MM:SS' (day D, counting from 0) to seconds since midnight of the
+    first day of a log"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    day, _, hms = value.strip().rpartition(' ')
+    h, m, s = (int(x) for x in hms.split(':'))
+    return int(day or 0) * 86400 + h * 3600 + m * 60 + s
+
+
+def _parse_row(line, timeline):
+    """Parse 'HH:MM:SS;T1;T2' line (bytes) into (seconds, t1, t2) or None"""
+    fields = line.split(b';')
+    try:
+        h, m, s = (int(x) for x in fields[0].split(b':'))
+        return (timeline.unwrap(h * 3600 + m * 60 + s), float(fields[1]), float(fields[2]))
+    except (ValueError, IndexError):
+        return None  # header or partially written line
+
+
+class IndexWriter(object):
+    """Writes sparse index of a CSV log: (seconds, byte offset) of every
+    every-th row. Entries are written by CsvWriter along with its data."""
+
+    def __init__(self, path, every=EVERY):
+        self._file = open(path, 'wt')
+        self._every = every
+        self._file.write('%s every=%d\n' % (_magic, every))
+
+    @property
+    def every(self):
+        return self._every
+
+    def add(self, seconds, offset):
+        self._file.write('%d %d\n' % (seconds, offset))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvIndex(object):
+    """Sparse index of a CSV log loaded from its sidecar file"""
+
+    def __init__(self, seconds, offsets, every):
+        self._seconds = seconds
+        self._offsets = offsets
+        self._every = every
+
+    @classmethod
+    def load(cls, path):
+        """Load index of CSV file at path, or None if there is none"""
+        try:
+            with open(index_path(path)) as f:
+                head = f.readline().split()
+                if ' '.join(head[:2]) != _magic:
+                    return None
+                every = int(head[2].split('=')[1])
+                seconds, offsets = [], []
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        seconds.append(int(fields[0]))
+                        offsets.append(int(fields[1]))
+        except (OSError, ValueError, IndexError):
+            return None
+        return cls(seconds, offsets, every)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def seek(self, seconds):
+        """Returns (offset, seconds) of the last indexed row at or before
+        seconds; (None, None) if the range starts before the first entry"""
+        i = bisect.bisect_right(self._seconds, seconds) - 1
+        if i < 0:
+            return (None, None)
+        return (self._offsets[i], self._seconds[i])
+
+    def tail(self, rows):
+        """Returns (offset, seconds) of an indexed row followed by at least
+        rows rows; (None, None) if the file should be read from the start"""
+        i = len(self._offsets) - 1 - (rows + self._every - 1) // self._every
+        if i < 0:
+            return (None, None)
+        return (self._offsets[i], self._seconds[i])
+
+
+def build_index(path, every=EVERY):
+    """(Re)build index sidecar of an existing CSV log. Returns CsvIndex"""
+    timeline = Timeline()
+    writer = IndexWriter(index_path(path), every)
+    seconds, offsets = [], []
+    try:
+        with open(path, 'rb') as f:
+            offset = 0
+            rows = 0
+            for line in f:
+                row = _parse_row(line, timeline)
+                if row is not None:
+                    if rows % every == 0:
+                        writer.add(row[0], offset)
+                        seconds.append(row[0])
+                        offsets.append(offset)
+                    rows += 1
+                offset += len(line)
+    finally:
+        writer.close()
+    return CsvIndex(seconds, offsets, every)
+
+
+def read_range(path, start=None, stop=None, index=None):
+    """Stream (seconds, t1, t2) rows of CSV log with start <= seconds < stop.
+
+    Times are seconds since midnight of the first day of the log (see
+    parse_time()). The index sidecar is used to seek close to start; it is
+    built first if missing."""
+    start, stop = parse_time(start), parse_time(stop)
+    if index is None:
+        index = CsvIndex.load(path) or build_index(path)
+    offset, seconds = (None, None) if start is None else index.seek(start)
+    timeline = Timeline(seconds)
+    with open(path, 'rb') as f:
+        if offset is not None:
+            f.seek(offset)
+        for line in f:
+            row = _parse_row(line, timeline)
+            if row is None:
+                continue
+            if stop is not None and row[0] >= stop:
+                return
+            if start is None or row[0] >= start:
+                yield row
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,374 @@
+# -*- coding: utf8 -*-
+
+import collections
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+from .binlog_ import BinaryLog
+from .decimate_ import decimate
+from .index_ import CsvIndex
+from .rollup_ import TIERS, read_rollup, rollup_path
+from .sample_ import Timeline
+from .sqlite_ import SampleDatabase
+
+__all__ = ('LivePlotter', )
+
+
+class _CsvTail(object):
+    """Reads rows appended to a CSV file written by CsvWriter"""
+
+    def __init__(self, path, last=None):
+        self._path = path
+        self._offset = 0
+        self._timeline = Timeline()
+        self._last = last
+
+    def read(self):
+        """Returns list of (time, t1, t2) rows appended since the last call"""
+        try:
+            size = os.path.getsize(self._path)
+        except OSError:
+            return []
+        if size <= self._offset:
+            return []
+        with open(self._path, 'rb') as f:
+            if self._last is not None and self._offset == 0:
+                # first read, only the last rows are needed
+                index = CsvIndex.load(self._path)
+                offset, seconds = index.tail(self._last) if index else (None, None)
+                if offset is not None:
+                    self._offset = offset
+                    self._timeline = Timeline(seconds)
+                else:
+                    self._offset = max(size - self._last * 32, 0)
+                    f.seek(self._offset)
+                    if self._offset:
+                        self._offset += len(f.readline())  # skip partial line
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        rows = []
+        for line in data[:end].splitlines():
+            fields = line.split(b';')
+            try:
+                h, m, s = (int(x) for x in fields[0].split(b':'))
+                rows.append((self._timeline.unwrap(h * 3600 + m * 60 + s),
+                             float(fields[1]), float(fields[2])))
+            except (ValueError, IndexError):
+                pass  # header
+        return rows
+
+
+class _BinaryTail(object):
+    """Reads records appended to a binary log written by BinaryWriter"""
+
+    def __init__(self, path, last=None):
+        self._path = path
+        self._count = None
+        self._last = last
+
+    def read(self):
+        try:
+            log = BinaryLog(self._path)
+        except (OSError, ValueError):
+            return []  # not created yet
+        with log:
+            start = self._count
+            if start is None and self._last is not None:
+                start = max(len(log) - self._last, 0)
+            columns = [log[name][start:] for name in ('time', 't1', 't2')]
+            rows = list(zip(*[c.tolist() if hasattr(c, 'tolist') else c for c in columns]))
+            self._count = len(log)
+        return rows
+
+
+class _SqliteTail(object):
+    """Reads samples inserted into the last session of a SQLite database
+    written by SqliteWriter"""
+
+    def __init__(self, path, last=None):
+        self._path = path
+        self._db = None
+        self._session = None
+        self._time = None
+        self._last = last
+
+    def read(self):
+        if self._db is None:
+            if not os.path.exists(self._path):
+                return []  # not created yet
+            self._db = SampleDatabase(self._path)
+        try:
+            if self._session is None:
+                self._session = self._db.last_session()
+                if self._session is None:
+                    return []
+            if self._time is None:
+                if self._last is not None:
+                    rows = self._db.tail(self._last, self._session)
+                else:
+                    rows = self._db.query(session=self._session)
+            else:
+                rows = self._db.since(self._time, self._session)
+        except sqlite3.OperationalError:
+            return []  # schema not created yet
+        if rows:
+            self._time = rows[-1][0]
+        return rows
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+class _RollupTail(object):
+    """Reads rolled-up tiers maintained next to a log (see RollupWriter)
+    instead of the log itself: the finest tier fitting in points (two per
+    bucket, its min and max) is read, new buckets are polled at most once
+    per bucket width"""
+
+    _bytes = 64  # least bytes per bucket in a tier file
+
+    def __init__(self, path, widths, points):
+        self._path = path
+        self._widths = sorted(widths)
+        self._points = points
+        self._width = None
+        self._next = None
+        self._polled = None
+
+    @classmethod
+    def available(cls, path):
+        """Returns tier widths maintained next to path"""
+        return [width for width in TIERS if os.path.exists(rollup_path(path, width))]
+
+    def read(self):
+        now = time.monotonic()
+        if self._width is None:
+            for width in self._widths:
+                self._width = width
+                try:
+                    size = os.path.getsize(rollup_path(self._path, width))
+                except OSError:
+                    continue
+                if size // self._bytes * 2 <= self._points:
+                    break
+        elif now - self._polled < self._width:
+            return []
+        self._polled = now
+        try:
+            rollups = read_rollup(self._path, self._width, self._next)
+        except OSError:
+            return []
+        if rollups:
+            self._next = rollups[-1].time + self._width
+        rows = []
+        for r in rollups:
+            rows.append((r.time, r.t1_min, r.t2_min))
+            rows.append((r.time + self._width // 2, r.t1_max, r.t2_max))
+        return rows
+
+
+class _BusTail(object):
+    """Reads history from a file source once, then samples published to a
+    SampleBus"""
+
+    def __init__(self, subscription, history):
+        self._subscription = subscription
+        self._history = history
+        self._timeline = None
+        self._last = None
+        self._traces = []
+
+    def read(self):
+        if self._timeline is None:
+            rows = self._history.read()
+            self._last = rows[-1][0] if rows else None
+            self._timeline = Timeline(self._last)
+        else:
+            rows = []
+        for sample in self._subscription.get_all():
+            seconds = self._timeline.unwrap(sample.seconds)
+            if self._last is None or seconds > self._last:
+                rows.append((seconds, sample.t1, sample.t2))
+                if sample.trace is not None:
+                    self._traces.append(sample.trace)
+        self._last = None
+        return rows
+
+    def displayed(self, when):
+        """Stamp traces of samples read so far as displayed"""
+        for trace in self._traces:
+            trace.displayed = when
+        self._traces = []
+
+    def close(self):
+        self._subscription.close()
+        if hasattr(self._history, 'close'):
+            self._history.close()
+
+
+class LivePlotter(object):
+    """Plots temperature graph in a separate window, keeping a single gnuplot
+    process alive.
+
+    Rows appended to data_file are read incrementally and kept in a bounded
+    window (of window most recent samples). Gnuplot is fed through its
+    stdin with an inline data block and redraws only when new samples
+    arrive, so the cost of a refresh does not depend on the file length.
+
+    Windows longer than points samples are decimated (method 'minmax' or
+    'lttb', see decimate()) before being sent to gnuplot. With window=None
+    the whole file is plotted, which is suitable for viewing long finished
+    recordings; if rolled-up tiers are maintained next to the file (see
+    RollupWriter), the finest tier fitting in points is plotted instead.
+
+    If bus (a SampleBus the device publishes to) is given, data_file is
+    read only once for the history and new samples come from the bus."""
+
+    def __init__(self, data_file, gnuplot='gnuplot', window=3600, poll=0.25,
+                 points=2000, method='minmax', bus=None, **kw):
+        self._subprocess = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.data_file = data_file
+        self.gnuplot = gnuplot
+        self._window = collections.deque(maxlen=window)
+        self._poll = poll
+        self._points = points
+        self._method = method
+        self._bus = bus
+        self._options = kw
+
+    @property
+    def subprocess(self):
+        """Subprocess running gnuplot executable"""
+        return self._subprocess
+
+    @property
+    def window(self):
+        """Samples currently plotted, as (time, t1, t2) tuples"""
+        return tuple(self._window)
+
+    def running(self):
+        """Returns True if the gnuplot subprocess is already running"""
+        return self.subprocess is not None and self.poll() is None
+
+    def cmd(self):
+        """Returns full commandline for running gnuplot through Popen"""
+        return [self.gnuplot]
+
+    def start(self, **kw):
+        """Starts plotter subprocess (gnuplot) and the thread feeding it"""
+        source = self._source()  # subscribe before gnuplot starts
+        self._subprocess = subprocess.Popen(self.cmd(), stdin=subprocess.PIPE,
+                                            universal_newlines=True, **kw)
+        self._send(self._script(**self._options))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(source,), daemon=True)
+        self._thread.start()
+
+    def poll(self):
+        """Check if child gnuplot process has terminated. Set and return
+        returncode attribute. Otherwise returns None"""
+        return self.subprocess.poll()
+
+    def terminate(self):
+        """Terminates gnuplot subprocess"""
+        self._stop.set()
+        self.subprocess.terminate()
+
+    def update(self, rows):
+        """Append (time, t1, t2) rows to the window and redraw"""
+        if rows:
+            self._window.extend(rows)
+            self._send(self._plot())
+
+    def _source(self):
+        last = self._window.maxlen
+        ext = os.path.splitext(self.data_file)[1].lower()
+        widths = _RollupTail.available(self.data_file) if last is None and self._points else []
+        if widths:
+            source = _RollupTail(self.data_file, widths, self._points)
+        elif ext == '.bin':
+            source = _BinaryTail(self.data_file, last)
+        elif ext in ('.db', '.sqlite', '.sqlite3'):
+            source = _SqliteTail(self.data_file, last)
+        else:
+            source = _CsvTail(self.data_file, last)
+        if self._bus is not None:
+            subscription = self._bus.subscribe(last or 1024, 'drop-oldest')
+            source = _BusTail(subscription, source)
+        return source
+
+    def _run(self, source):
+        try:
+            while not self._stop.is_set() and self.poll() is None:
+                try:
+                    self.update(source.read())
+                except (BrokenPipeError, ValueError):  # gnuplot gone
+                    break
+                if hasattr(source, 'displayed'):
+                    source.displayed(time.monotonic())
+                self._stop.wait(self._poll)
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+
+    def _send(self, text):
+        self.subprocess.stdin.write(text)
+        self.subprocess.stdin.flush()
+
+    def _plot(self):
+        """Returns gnuplot commands redrawing the window"""
+        x, t1, t2 = zip(*self._window)
+        if self._points is not None:
+            channels = decimate(x, (t1, t2), self._points, self._method)
+        else:
+            channels = [(x, t1), (x, t2)]
+        text = []
+        for name, (cx, cy) in zip(('$t1', '$t2'), channels):
+            text.append('%s << EOD\n' % name)
+            text.extend("%d %f\n" % xy for xy in zip(cx, cy))
+            text.append('EOD\n')
+        text.append('plot $t1 using 1:2 with lines title "T1", '
+                    '$t2 using 1:2 with lines title "T2"\n')
+        return ''.join(text)
+
+    @classmethod
+    def _script(cls, **kw):
+        """Returns gnuplot setup commands as string"""
+        options = dict({
+            'yrange': '[0:300]',
+            'title': 'Temperatures'
+        }, **kw)
+
+        return """
+        # Bindings
+        bind "Close" "exit gnuplot"
+
+        # Plot Title
+        set title "%(title)s"
+
+        # X axis settings
+        set xdata time
+        set timefmt "%%s"
+        set format x "%%H:%%M:%%S"
+        set xtics rotate by 45 right
+
+        # Y axis
+        set yrange %(yrange)s
+
+        # Grid
+        set grid
+        """ % options
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,198 @@
+# -*- coding: utf8 -*-
+
+import bisect
+import threading
+import time
+
+__all__ = ('Counter', 'Gauge', 'Histogram', 'Metrics', 'exposition')
+
+
+# seconds, for timing hot paths
+TIME_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter(object):
+    """Monotonically increasing value"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def snapshot(self):
+        return self._value
+
+    def _samples(self):
+        yield ('', None, self._value)
+
+
+class Gauge(Counter):
+    """Value that may go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value):
+        self._value = value
+
+
+class _Timer(object):
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram(object):
+    """Distribution of observed values in cumulative buckets (upper bounds
+    given by buckets), with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self._bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._bounds) + 1)  # last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def time(self):
+        """Context manager observing duration of its block in seconds"""
+        return _Timer(self)
+
+    def buckets(self):
+        """List of (upper bound, cumulative count) pairs"""
+        bounds = self._bounds + (float('inf'),)
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self._counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self):
+        return {'count': self._count, 'sum': self._sum, 'buckets': self.buckets()}
+
+    def _samples(self):
+        for bound, count in self.buckets():
+            yield ('_bucket', ('le', '+Inf' if bound == float('inf') else repr(bound)), count)
+        yield ('_sum', None, self._sum)
+        yield ('_count', None, self._count)
+
+
+class Metrics(object):
+    """Registry of metrics of one component (e.g. a device), distinguished
+    from other registries by labels (e.g. {'device': '/dev/ttyUSB0'}).
+
+    Metrics are updated without locking from the thread owning the
+    component; readers get a consistent enough view for monitoring."""
+
+    def __init__(self, labels=None, prefix='chy506r_'):
+        self._lock = threading.RLock()
+        self._labels = dict(labels or {})
+        self._prefix = prefix
+        self._metrics = {}
+
+    @property
+    def labels(self):
+        return dict(self._labels)
+
+    def counter(self, name, help=''):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=''):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help='', buckets=TIME_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._metrics.values()))
+
+    def snapshot(self):
+        """Returns dict of current metric values"""
+        return dict((m.name, m.snapshot()) for m in self)
+
+    def text(self):
+        """Returns metrics in Prometheus text exposition format"""
+        return exposition([self])
+
+    def _get(self, cls, name, help, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError("metric %r is a %s" % (name, metric.kind))
+            return metric
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{%s}' % ','.join('%s="%s"' % (k, escape(v)) for k, v in labels)
+
+
+def exposition(registries):
+    """Returns metrics of several registries (e.g. one per device) in
+    Prometheus text exposition format"""
+    families = {}
+    for registry in registries:
+        for metric in registry:
+            families.setdefault(registry._prefix + metric.name, []).append((registry, metric))
+    lines = []
+    for name in sorted(families):
+        first = families[name][0][1]
+        if first.help:
+            lines.append('# HELP %s %s' % (name, first.help))
+        lines.append('# TYPE %s %s' % (name, first.kind))
+        for registry, metric in families[name]:
+            labels = sorted(registry._labels.items())
+            for suffix, extra, value in metric._samples():
+                lines.append('%s%s%s %s' % (name, suffix, _format_labels(labels + ([extra] if extra else [])),
+                                            repr(float(value)) if isinstance(value, float) else value))
+    return '\n'.join(lines) + '\n'
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,144 @@
+# -*- coding: utf8 -*-
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .framer_ import FRAME_LENGTH, FRAME_RE
+
+__all__ = ('Frames', 'parse_frames')
+
+
+# Below this number of frames the pure-Python parser is faster than NumPy
+NUMPY_THRESHOLD = 64
+
+
+class Frames(object):
+    """Batch of decoded frames.
+
+    Each attribute holds one column; NumPy arrays if the frames were
+    decoded with NumPy, lists otherwise. Fields of invalid frames (see
+    the valid mask) are zeroed."""
+
+    __slots__ = ('t1', 't2', 'hour', 'minute', 'second', 'status', 'valid')
+
+    def __init__(self, t1, t2, hour, minute, second, status, valid):
+        self.t1 = t1
+        self.t2 = t2
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.status = status
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.valid)
+
+    def rows(self):
+        """Iterate over valid frames yielding (t1, t2, (h, m, s), status)
+        tuples"""
+        columns = (self.t1, self.t2, self.hour, self.minute, self.second,
+                   self.status, self.valid)
+        if numpy is not None and isinstance(self.valid, numpy.ndarray):
+            columns = [c.tolist() for c in columns]
+        for t1, t2, h, m, s, status, valid in zip(*columns):
+            if valid:
+                if isinstance(status, bytes):
+                    status = status.decode('ascii', 'replace')
+                yield (t1, t2, (h, m, s), status)
+
+
+def parse_frames(buf, stride=FRAME_LENGTH, use_numpy=None):
+    """Decode all frames stored in a contiguous buffer.
+
+    Frames are expected at offsets 0, stride, 2*stride, ... (stride may
+    exceed FRAME_LENGTH if frames are separated, e.g. by CR LF); trailing
+    incomplete frame is ignored. By default NumPy is used if available and
+    the buffer holds enough frames to make it pay off."""
+    n = (len(buf) + stride - FRAME_LENGTH) // stride if len(buf) >= FRAME_LENGTH else 0
+    if use_numpy is None:
+        use_numpy = numpy is not None and n >= NUMPY_THRESHOLD
+    if use_numpy:
+        return _parse_numpy(buf, n, stride)
+    else:
+        return _parse_python(buf, n, stride)
+
+
+def _parse_python(buf, n, stride):
+    buf = bytes(buf)
+    columns = tuple([] for _ in range(7))
+    t1s, t2s, hs, ms, ss, statuses, valids = columns
+    for i in range(0, n * stride, stride):
+        s = buf[i:i+FRAME_LENGTH]
+        match = FRAME_RE.match(s)
+        if match:
+            h, m, sec = int(s[16:18]), int(s[18:20]), int(s[20:22])
+        if not (match and h < 24 and m < 60 and sec < 60):
+            for column, zero in zip(columns, (0.0, 0.0, 0, 0, 0, b'', False)):
+                column.append(zero)
+            continue
+        t1 = int(s[1:7], 16) / 1000
+        t2 = int(s[9:15], 16) / 1000
+        t1s.append(-t1 if s[0] == ord('-') else t1)
+        t2s.append(-t2 if s[8] == ord('-') else t2)
+        hs.append(h)
+        ms.append(m)
+        ss.append(sec)
+        statuses.append(s[22:])
+        valids.append(True)
+    return Frames(*columns)
+
+
+def _lookup_tables():
+    hexdigits = numpy.full(256, -1, dtype=numpy.int64)
+    for i, c in enumerate(b'0123456789ABCDEF'):
+        hexdigits[c] = i
+    for i, c in enumerate(b'abcdef'):
+        hexdigits[c] = 10 + i
+    digits = numpy.full(256, -1, dtype=numpy.int64)
+    digits[ord('0'):ord('9')+1] = numpy.arange(10)
+    return hexdigits, digits
+
+
+_tables = None
+_free_columns = [0, 7, 8, 15] + list(range(22, FRAME_LENGTH))
+
+
+def _parse_numpy(buf, n, stride):
+    global _tables
+    if _tables is None:
+        _tables = _lookup_tables()
+    hexdigits, digits = _tables
+
+    raw = numpy.frombuffer(buf, dtype=numpy.uint8, count=min(len(buf), n * stride))
+    if len(raw) < n * stride:  # last frame not followed by a separator
+        raw = numpy.concatenate((raw, numpy.zeros(n * stride - len(raw), numpy.uint8)))
+    a = raw.reshape(n, stride)
+
+    weights = 16 ** numpy.arange(5, -1, -1, dtype=numpy.int64)
+    h1, h2 = hexdigits[a[:, 1:7]], hexdigits[a[:, 9:15]]
+    d = digits[a[:, 16:22]]
+    valid = (h1 >= 0).all(1) & (h2 >= 0).all(1) & (d >= 0).all(1)
+    # like FRAME_RE, no line terminators in the free-form columns
+    free = a[:, _free_columns]
+    valid &= ((free != ord('\r')) & (free != ord('\n'))).all(1)
+    t1 = numpy.where(a[:, 0] == ord('-'), -1.0, 1.0) * h1.dot(weights) / 1000
+    t2 = numpy.where(a[:, 8] == ord('-'), -1.0, 1.0) * h2.dot(weights) / 1000
+    hour = d[:, 0] * 10 + d[:, 1]
+    minute = d[:, 2] * 10 + d[:, 3]
+    second = d[:, 4] * 10 + d[:, 5]
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
+    status = numpy.ascontiguousarray(a[:, 22:FRAME_LENGTH]).view('S%d' % (FRAME_LENGTH - 22)).ravel()
+
+    invalid = ~valid
+    for column in (t1, t2, hour, minute, second):
+        column[invalid] = 0
+    status[invalid] = b''
+    return Frames(t1, t2, hour, minute, second, status, valid)
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,159 @@
+# -*- coding: utf8 -*-
+
+import multiprocessing
+import threading
+
+from .chy506r_ import Chy506R, device_metrics
+from .ring_ import SampleRing, RingReader, RUNNING, DONE, ABORTED
+from .stats_ import LiveStatistics
+
+__all__ = ('AcquisitionProcess', )
+
+
+def _acquire(name, tty, output, stop, kw):
+    """Entry point of the acquisition process"""
+    ring = SampleRing(name)
+    try:
+        def listener(event, data):
+            if event == 'started':
+                ring.set_state(RUNNING)
+            elif event == 'sample':
+                metrics = device.metrics
+                ring.set_counters(metrics['frames_total'].value, metrics['protocol_errors_total'].value)
+
+        device = Chy506R(tty, output, listener=listener, bus=ring, **kw)
+        device.start()
+        while device.is_alive():
+            if stop.wait(0.25):
+                device.stop()
+                break
+        device.join()
+        ring.set_state(DONE if device.done else ABORTED)
+    except KeyboardInterrupt:
+        ring.set_state(ABORTED)
+    finally:
+        ring.close()
+
+
+class AcquisitionProcess(object):
+    """Runs Chy506R in a separate process, so that acquisition timing does
+    not depend on the load of this one (e.g. GUI redraws).
+
+    Samples are passed back through a SampleRing in shared memory. A thread
+    of this process reads them every poll seconds, publishes them to bus
+    (if given) and notifies listener like Chy506R does. The interface
+    follows Chy506R (start(), stop(), join(), is_alive(), done, count,
+    metrics, stats); other keyword arguments are passed to Chy506R."""
+
+    def __init__(self, tty, output, capacity=4096, listener=None, bus=None, poll=0.1, **kw):
+        self._lock = threading.RLock()
+        self._tty = tty
+        self._output = output
+        self._capacity = capacity
+        self._listener = listener
+        self._bus = bus
+        self._poll = poll
+        self._kw = kw
+        self._metrics = device_metrics({'device': tty})
+        self._stats = LiveStatistics()
+        self._context = multiprocessing.get_context('spawn')  # don't fork GUI state
+        self._stop = self._context.Event()
+        self._ring = None
+        self._process = None
+        self._monitor = None
+        self._done = False
+        self._count = 0
+
+    @property
+    def done(self):
+        """Whether measurements are done as user requested"""
+        return self._done
+
+    @property
+    def count(self):
+        """Number of entries written to the output file"""
+        return self._count
+
+    @property
+    def metrics(self):
+        """Metrics mirrored from the acquisition process (samples, frames
+        and protocol errors)"""
+        return self._metrics
+
+    @property
+    def stats(self):
+        """Running statistics of the samples received (StatsSnapshot)"""
+        return self._stats.snapshot()
+
+    @property
+    def ring(self):
+        """SampleRing the samples are published to, for other readers"""
+        return self._ring
+
+    @property
+    def bus(self):
+        return self._bus
+
+    def start(self):
+        self._ring = SampleRing(create=True, capacity=self._capacity)
+        self._process = self._context.Process(
+            target=_acquire, args=(self._ring.name, self._tty, self._output, self._stop, self._kw),
+            daemon=True)
+        self._process.start()
+        self._monitor = threading.Thread(target=self._run, daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        """Stop iteration/finish measurements"""
+        self._stop.set()
+
+    def is_alive(self):
+        return self._monitor is not None and self._monitor.is_alive()
+
+    def join(self, timeout=None):
+        self._monitor.join(timeout)
+
+    def _notify(self, event, data=None):
+        if self._listener is not None:
+            self._listener(event, data)
+
+    def _update(self, reader):
+        samples = reader.read()
+        if not samples:
+            return
+        frames, errors = self._ring.counters
+        with self._lock:
+            self._count += len(samples)
+            for name, value in (('samples_total', self._count), ('frames_total', frames),
+                                ('protocol_errors_total', errors)):
+                counter = self._metrics[name]
+                counter.inc(value - counter.value)
+        for sample in samples:
+            self._stats.add(sample)
+        if self._bus is not None:
+            for sample in samples:
+                self._bus.publish(sample)
+        self._notify('sample', self._count)
+
+    def _run(self):
+        reader = RingReader(self._ring, 0)
+        started = False
+        try:
+            while self._process.is_alive():
+                if not started and self._ring.state != 0:
+                    started = True
+                    self._notify('started')
+                self._update(reader)
+                self._process.join(self._poll)
+            self._update(reader)
+            self._done = self._ring.state == DONE
+        finally:
+            self._ring.close()
+            self._ring.unlink()
+            self._notify('stopped', self._done)
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
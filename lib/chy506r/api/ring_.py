@@ -0,0 +1,172 @@
+# -*- coding: utf8 -*-
+
+import struct
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover, Python < 3.8
+    shared_memory = None
+
+from .sample_ import Sample
+
+__all__ = ('SampleRing', 'RingReader')
+
+
+_magic = b'CHY506RR'
+# magic, capacity, slot size, head (samples published), state, frames, errors
+_header = struct.Struct('<8sIIQIQQ')
+_HEADER_SIZE = 64
+# fields updated separately: (offset, struct)
+_head = (16, struct.Struct('<Q'))
+_state = (24, struct.Struct('<I'))
+_frames = (28, struct.Struct('<Q'))
+_errors = (36, struct.Struct('<Q'))
+_seq = struct.Struct('<Q')
+_record = struct.Struct('<Idd8sH')   # seconds, t1, t2, status, count
+_SLOT_SIZE = 48
+
+# acquisition states
+CREATED, RUNNING, DONE, ABORTED = range(4)
+
+
+class SampleRing(object):
+    """Ring buffer of samples in shared memory, for passing samples from an
+    acquisition process to readers in other processes.
+
+    There is a single writer (publish()) and any number of readers (see
+    RingReader), none of them locking. Each slot carries a sequence number
+    which is odd while the slot is being written, so readers detect torn
+    and overwritten records. The header holds the number of published
+    samples and acquisition state and counters.
+
+    With create=True a new segment named name (or a generated name) is
+    created and owned: unlink() removes it. Otherwise the existing segment
+    name is attached to."""
+
+    def __init__(self, name=None, create=False, capacity=4096):
+        if shared_memory is None:
+            raise RuntimeError("shared memory requires Python >= 3.8")
+        if create:
+            size = _HEADER_SIZE + capacity * _SLOT_SIZE
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+            _header.pack_into(self._shm.buf, 0, _magic, capacity, _SLOT_SIZE, 0, CREATED, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            magic, capacity, slot = _header.unpack_from(self._shm.buf, 0)[:3]
+            if magic != _magic or slot != _SLOT_SIZE:
+                self._shm.close()
+                raise ValueError("%s is not a sample ring" % name)
+        self._buf = self._shm.buf
+        self._capacity = capacity
+        self._head = self.head
+
+    @property
+    def name(self):
+        """Name of the shared memory segment, to attach other processes"""
+        return self._shm.name
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def head(self):
+        """Number of samples published so far"""
+        return self._get(_head)
+
+    @property
+    def state(self):
+        """Acquisition state: CREATED, RUNNING, DONE or ABORTED"""
+        return self._get(_state)
+
+    @property
+    def counters(self):
+        """(frames, protocol errors) as updated with set_counters()"""
+        return (self._get(_frames), self._get(_errors))
+
+    def set_state(self, state):
+        self._set(_state, state)
+
+    def set_counters(self, frames, errors):
+        self._set(_frames, frames)
+        self._set(_errors, errors)
+
+    def publish(self, sample):
+        """Append sample (single writer only), so the ring can be used in
+        place of a SampleBus"""
+        n = self._head
+        offset = _HEADER_SIZE + (n % self._capacity) * _SLOT_SIZE
+        _seq.pack_into(self._buf, offset, 2 * n + 1)  # being written
+        _record.pack_into(self._buf, offset + _seq.size, sample.seconds, sample.t1, sample.t2,
+                          (sample.status or '').encode('ascii', 'replace'), min(sample.count, 0xffff))
+        _seq.pack_into(self._buf, offset, 2 * n + 2)
+        self._head = n + 1
+        self._set(_head, n + 1)
+
+    def slot(self, n):
+        """Returns n-th published sample, or None if it has been overwritten
+        (or is being written)"""
+        offset = _HEADER_SIZE + (n % self._capacity) * _SLOT_SIZE
+        seq = _seq.unpack_from(self._buf, offset)[0]
+        seconds, t1, t2, status, count = _record.unpack_from(self._buf, offset + _seq.size)
+        if seq != 2 * n + 2 or _seq.unpack_from(self._buf, offset)[0] != seq:
+            return None
+        h, ms = divmod(seconds, 3600)
+        status = status.rstrip(b'\0').decode('ascii', 'replace')
+        return Sample((h, ms // 60, ms % 60), t1, t2, status, count)
+
+    def close(self):
+        """Detach from the shared memory"""
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        """Remove the shared memory segment (by its owner)"""
+        self._shm.unlink()
+
+    def _get(self, field):
+        offset, fmt = field
+        return fmt.unpack_from(self._buf, offset)[0]
+
+    def _set(self, field, value):
+        offset, fmt = field
+        fmt.pack_into(self._buf, offset, value)
+
+
+class RingReader(object):
+    """Reads samples published to a SampleRing since the last read.
+
+    A reader falling behind by more than the ring capacity loses the
+    oldest samples; these are counted in lost."""
+
+    def __init__(self, ring, start=None):
+        self._ring = ring
+        self._next = ring.head if start is None else start
+        self._lost = 0
+
+    @property
+    def lost(self):
+        """Number of samples overwritten before they were read"""
+        return self._lost
+
+    def read(self):
+        """Returns list of samples published since the last call"""
+        head = self._ring.head
+        if head - self._next > self._ring.capacity:
+            self._lost += head - self._ring.capacity - self._next
+            self._next = head - self._ring.capacity
+        samples = []
+        for n in range(self._next, head):
+            sample = self._ring.slot(n)
+            if sample is None:
+                self._lost += 1
+            else:
+                samples.append(sample)
+        self._next = head
+        return samples
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,171 @@
+# -*- coding: utf8 -*-
+
+import collections
+
+from .sample_ import Timeline
+from .writer_ import Writer
+
+__all__ = ('Rollup', 'RollupWriter', 'rollup_path', 'read_rollup')
+
+
+TIERS = (10, 60, 900, 3600)
+
+_header = "TIME;COUNT;T1_MIN;T1_MAX;T1_MEAN;T2_MIN;T2_MAX;T2_MEAN\n"
+
+
+class Rollup(collections.namedtuple('Rollup', ('time', 'count', 't1_min', 't1_max', 't1_mean',
+                                               't2_min', 't2_max', 't2_mean'))):
+    """Aggregate of samples within one time bucket of a tier.
+
+    time is the bucket start in seconds since midnight of the first day
+    (as BinaryWriter stores it), count is the number of samples."""
+
+    __slots__ = ()
+
+
+def _tier_name(width):
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if width % size == 0:
+            return '%d%s' % (width // size, unit)
+    return '%ds' % width
+
+
+def rollup_path(output, width):
+    """Returns path of the rollup file of given tier width (in seconds)
+    maintained next to output, e.g. log.csv.1h.csv for log.csv (outputs
+    differing in extension only get separate tiers)"""
+    return '%s.%s.csv' % (output, _tier_name(width))
+
+
+class _TierWriter(Writer):
+    def _header(self):
+        return _header
+
+    def _format(self, row):
+        return "%d;%d;%f;%f;%f;%f;%f;%f\n" % row
+
+    def _join(self, records):
+        return ''.join(records)
+
+
+class _Bucket(object):
+    __slots__ = ('start', 'count', 'min1', 'max1', 'sum1', 'min2', 'max2', 'sum2')
+
+    def __init__(self, start, t1, t2):
+        self.start = start
+        self.count = 1
+        self.min1 = self.max1 = self.sum1 = t1
+        self.min2 = self.max2 = self.sum2 = t2
+
+    def add(self, t1, t2):
+        self.count += 1
+        self.sum1 += t1
+        self.sum2 += t2
+        if t1 < self.min1:
+            self.min1 = t1
+        elif t1 > self.max1:
+            self.max1 = t1
+        if t2 < self.min2:
+            self.min2 = t2
+        elif t2 > self.max2:
+            self.max2 = t2
+
+    def rollup(self):
+        return Rollup(self.start, self.count, self.min1, self.max1, self.sum1 / self.count,
+                      self.min2, self.max2, self.sum2 / self.count)
+
+
+class RollupWriter(object):
+    """Maintains rolled-up tiers of samples incrementally.
+
+    For every tier width (in seconds) min/max/mean/count of T1 and T2 are
+    aggregated per bucket and the bucket is written to its tier file (see
+    rollup_path()) as soon as a sample from a later bucket arrives. Partial
+    buckets are written on close. Used as a writer (e.g. within TeeWriter)."""
+
+    def __init__(self, output, tiers=TIERS, policy=None):
+        self._tiers = tuple(tiers)
+        self._timeline = Timeline()
+        self._buckets = [None] * len(self._tiers)
+        self._writers = []
+        try:
+            for width in self._tiers:
+                self._writers.append(_TierWriter.open(rollup_path(output, width), policy))
+        except Exception:
+            for writer in self._writers:
+                writer.close()
+            raise
+
+    @property
+    def tiers(self):
+        return self._tiers
+
+    @property
+    def pending(self):
+        return max(w.pending for w in self._writers)
+
+    def begin(self):
+        for w in self._writers:
+            w.begin()
+
+    def write(self, sample):
+        seconds = self._timeline.unwrap(sample.seconds)
+        t1, t2 = sample.t1, sample.t2
+        for i, width in enumerate(self._tiers):
+            start = seconds - seconds % width
+            bucket = self._buckets[i]
+            if bucket is not None and bucket.start == start:
+                bucket.add(t1, t2)
+                continue
+            if bucket is not None:
+                self._writers[i].write(bucket.rollup())
+            self._buckets[i] = _Bucket(start, t1, t2)
+
+    def tick(self):
+        for w in self._writers:
+            w.tick()
+
+    def flush(self):
+        for w in self._writers:
+            w.flush()
+
+    def close(self):
+        try:
+            for bucket, writer in zip(self._buckets, self._writers):
+                if bucket is not None:
+                    writer.write(bucket.rollup())
+        finally:
+            for writer in self._writers:
+                writer.close()
+            self._buckets = [None] * len(self._tiers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_rollup(output, width, start=None, stop=None):
+    """Read rollups of given tier maintained next to output, optionally
+    only buckets with start <= time < stop. Returns list of Rollup"""
+    rows = []
+    with open(rollup_path(output, width)) as f:
+        f.readline()  # header
+        for line in f:
+            fields = line.split(';')
+            if len(fields) != len(Rollup._fields):
+                continue  # partially written line
+            time = int(fields[0])
+            if start is not None and time < start:
+                continue
+            if stop is not None and time >= stop:
+                break
+            rows.append(Rollup(time, int(fields[1]), *(float(x) for x in fields[2:])))
+    return rows
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
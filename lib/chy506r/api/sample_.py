@@ -0,0 +1,69 @@
+# -*- coding: utf8 -*-
+
+import collections
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+__all__ = ('Sample', 'Timeline')
+
+
+class Sample(collections.namedtuple('Sample', ('time', 't1', 't2', 'status', 'count', 'trace'))):
+    """Averaged measurement.
+
+    time is the device clock (h, m, s) tuple, t1 and t2 are mean
+    temperatures, status is the device status of the last frame and count
+    is the number of frames averaged. trace holds host timestamps of the
+    sample (see Trace) when tracing, None otherwise."""
+
+    __slots__ = ()
+
+    def __new__(cls, time, t1, t2, status, count, trace=None):
+        return super().__new__(cls, time, t1, t2, status, count, trace)
+
+    @property
+    def seconds(self):
+        """Device time as seconds since midnight"""
+        h, m, s = self.time
+        return h * 3600 + m * 60 + s
+
+
+class Timeline(object):
+    """Turns device time (seconds since midnight) into seconds since
+    midnight of the first day, so that it keeps growing past midnight.
+
+    If start (already unwrapped seconds) is given, the timeline continues
+    from that point."""
+
+    def __init__(self, start=None):
+        if start is None:
+            self._day, self._last = 0, None
+        else:
+            self._day, self._last = divmod(start, 86400)
+
+    def unwrap(self, seconds):
+        # the device clock may be adjusted slightly backwards, only a big
+        # jump means next day
+        if self._last is not None and seconds < self._last - 43200:
+            self._day += 1
+        self._last = seconds
+        return self._day * 86400 + seconds
+
+    def unwrap_all(self, seconds):
+        """Unwrap a sequence of device times at once, returns an array
+        (list without NumPy)"""
+        if numpy is None or not len(seconds):
+            return [self.unwrap(s) for s in seconds]
+        seconds = numpy.asarray(seconds, dtype=numpy.int64)
+        last = seconds[0] if self._last is None else self._last
+        days = numpy.cumsum(numpy.diff(seconds, prepend=last) < -43200) + self._day
+        self._day, self._last = int(days[-1]), int(seconds[-1])
+        return days * 86400 + seconds
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,221 @@
+# -*- coding: utf8 -*-
+
+import collections
+import http.server
+import json
+import socketserver
+import threading
+import urllib.parse
+
+from .bus_ import SampleBus, Subscriber
+from .metrics_ import Metrics, exposition
+from .sample_ import Timeline
+
+__all__ = ('SampleServer', )
+
+
+_page = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>CHY 506R</title></head>
+<body>
+<h1>CHY 506R</h1>
+<p>Time: <span id="time">-</span></p>
+<p>T1: <span id="t1">-</span> &deg;C, T2: <span id="t2">-</span> &deg;C</p>
+<script>
+var source = new EventSource('/events');
+source.onmessage = function(e) {
+    var s = JSON.parse(e.data);
+    document.getElementById('time').textContent = s.time;
+    document.getElementById('t1').textContent = s.t1.toFixed(2);
+    document.getElementById('t2').textContent = s.t2.toFixed(2);
+};
+</script>
+</body>
+</html>
+"""
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        server = self.server.sample_server
+        if url.path == '/':
+            self._send(200, 'text/html; charset=utf-8', _page)
+        elif url.path == '/current':
+            self._send_json(server.current)
+        elif url.path == '/history':
+            try:
+                last = int(query['last'][0]) if 'last' in query else None
+            except ValueError:
+                return self.send_error(400, "last must be an integer")
+            self._send_json(server.history(last))
+        elif url.path == '/events':
+            self._stream(server)
+        elif url.path == '/metrics' and server.metrics:
+            self._send(200, 'text/plain; version=0.0.4', exposition(server.metrics))
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass  # don't clutter the logger's output
+
+    def _send(self, status, content_type, body):
+        body = body.encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data):
+        self._send(200, 'application/json', json.dumps(data))
+
+    def _stream(self, server):
+        """Server-Sent Events, one event per sample"""
+        subscription = server.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(b'retry: 2000\n\n')
+            self.wfile.flush()
+            while True:
+                event = subscription.get(server.keepalive)
+                if event is None:
+                    if subscription.closed:
+                        break
+                    event = b': keepalive\n\n'
+                self.wfile.write(event)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gone
+        finally:
+            subscription.close()
+
+
+class SampleServer(object):
+    """Serves samples published to a SampleBus over HTTP.
+
+    GET / shows a page with live values, /current returns the last sample
+    as JSON, /history?last=N the last N (by default all kept) samples and
+    /events streams samples as Server-Sent Events. Each sample is encoded
+    once and passed to every client through its own bounded queue
+    (buffer samples, oldest dropped), so a slow client can't stall the
+    acquisition or other clients.
+
+    Samples are JSON objects with time (device clock), seconds (since
+    midnight of the first day, see Timeline), t1, t2, status and count.
+
+    If metrics (a Metrics registry or a list of them) are given, they are
+    served at /metrics in Prometheus text format."""
+
+    def __init__(self, bus, host='127.0.0.1', port=8506, history=3600, buffer=256, keepalive=15,
+                 metrics=None):
+        self._bus = bus
+        self._metrics = [metrics] if isinstance(metrics, Metrics) else list(metrics or ())
+        self._host = host
+        self._port = port
+        self._history = collections.deque(maxlen=history)
+        self._buffer = buffer
+        self._keepalive = keepalive
+        self._lock = threading.RLock()
+        self._timeline = Timeline()
+        self._clients = SampleBus()
+        self._subscriber = None
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """(host, port) the server listens on, once started"""
+        return self._httpd.server_address if self._httpd is not None else (self._host, self._port)
+
+    @property
+    def url(self):
+        return 'http://%s:%d/' % self.address[:2]
+
+    @property
+    def metrics(self):
+        """Metrics registries served at /metrics"""
+        return self._metrics
+
+    @property
+    def keepalive(self):
+        """Interval of keep-alive comments sent to idle event streams"""
+        return self._keepalive
+
+    @property
+    def clients(self):
+        """Number of connected event streams"""
+        return len(self._clients.subscriptions)
+
+    @property
+    def current(self):
+        """Last sample (dict) or None"""
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+    def history(self, last=None):
+        """List of last samples (dicts), all kept if last is None"""
+        with self._lock:
+            samples = list(self._history)
+        return samples if last is None else samples[-last:] if last > 0 else []
+
+    def subscribe(self):
+        """Returns Subscription yielding encoded Server-Sent Events"""
+        return self._clients.subscribe(self._buffer, 'drop-oldest')
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._httpd = _HTTPServer((self._host, self._port), _Handler)
+        self._httpd.sample_server = self
+        self._subscriber = Subscriber(self._bus.subscribe(self._buffer, 'drop-oldest'), self._publish)
+        self._subscriber.start()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving, disconnect all clients"""
+        if self._httpd is None:
+            return
+        self._subscriber.stop()
+        self._clients.close()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+        self._subscriber.join()
+        self._httpd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _publish(self, sample):
+        record = {
+            'time': '%02d:%02d:%02d' % sample.time,
+            'seconds': self._timeline.unwrap(sample.seconds),
+            't1': sample.t1,
+            't2': sample.t2,
+            'status': sample.status,
+            'count': sample.count,
+        }
+        with self._lock:
+            self._history.append(record)
+        self._clients.publish(('id: %d\ndata: %s\n\n' % (record['seconds'], json.dumps(record))).encode('utf8'))
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,242 @@
+# -*- coding: utf8 -*-
+
+import fcntl
+import heapq
+import itertools
+import os
+import pty
+import random
+import selectors
+import termios
+import threading
+import time
+import tty
+import weakref
+
+__all__ = ('Simulator', 'VirtualDevice', 'virtual_ttys')
+
+
+_simulators = weakref.WeakSet()
+
+
+def virtual_ttys():
+    """Returns paths to TTYs of all virtual devices of running simulators"""
+    return [path for sim in list(_simulators) if sim.is_alive()
+            for path in sim.paths()]
+
+
+class VirtualDevice(object):
+    """Simulated CHY506R attached to a pseudo-terminal.
+
+    The device starts sending frames after receiving "A" and stops after
+    "B", just like the real one. Faults are injected with given
+    probabilities (per frame): broken (corrupted) frames, short (truncated)
+    lines, stalls (no data for stall_time seconds) and disconnects (the
+    pseudo-terminal gets closed)."""
+
+    def __init__(self, rate=2.0, t1=20.0, t2=20.0, broken=0.0, short=0.0,
+                 stall=0.0, stall_time=5.0, disconnect=0.0, seed=None):
+        self._rate = rate
+        self._temperatures = [t1, t2]
+        self._broken = broken
+        self._short = short
+        self._stall = stall
+        self._stall_time = stall_time
+        self._disconnect = disconnect
+        self._random = random.Random(seed)
+        self._running = False
+        self._connected = True
+        self._frames = 0
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        flags = fcntl.fcntl(self._master, fcntl.F_GETFL)
+        fcntl.fcntl(self._master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self._path = os.ttyname(self._slave)
+
+    @property
+    def path(self):
+        """Path to the TTY the device is attached to"""
+        return self._path
+
+    @property
+    def running(self):
+        """Whether the device has been started ("A" received)"""
+        return self._running
+
+    @property
+    def connected(self):
+        """False after simulated disconnect"""
+        return self._connected
+
+    @property
+    def frames(self):
+        """Number of frames sent so far"""
+        return self._frames
+
+    @property
+    def interval(self):
+        """Time between consecutive frames"""
+        return 1.0 / self._rate
+
+    def fileno(self):
+        return self._master
+
+    def frame(self):
+        """Returns next frame (with line terminator) as bytes"""
+        clock = time.localtime()
+        for i, t in enumerate(self._temperatures):
+            self._temperatures[i] = t + self._random.gauss(0, 0.1)
+        t1, t2 = (int(round(t * 1000)) for t in self._temperatures)
+        return ("%s%06X0%s%06X0%02d%02d%02d00000000\r\n" % (
+            '-' if t1 < 0 else '+', abs(t1), '-' if t2 < 0 else '+', abs(t2),
+            clock.tm_hour, clock.tm_min, clock.tm_sec)).encode()
+
+    def receive(self):
+        """Handle commands sent to the device"""
+        try:
+            data = os.read(self._master, 1024)
+        except OSError:
+            return
+        for c in data:
+            if c == ord('A'):
+                self._running = True
+            elif c == ord('B'):
+                self._running = False
+                self._reset_tty()
+
+    def _reset_tty(self):
+        """Restore the default speed of the pseudo-terminal for the next
+        client.
+
+        Pseudo-terminals keep the speed but not the character size and
+        parity a client sets; some kernels then reject the next client's
+        7E1 setup with EINVAL, as it changes nothing."""
+        try:
+            attrs = termios.tcgetattr(self._slave)
+            attrs[4] = attrs[5] = termios.B38400
+            termios.tcsetattr(self._slave, termios.TCSANOW, attrs)
+        except termios.error:
+            pass
+
+    def send(self, now):
+        """Send next frame (if running) and return time (monotonic) of the
+        next one, or None if the device got disconnected"""
+        if not self._running:
+            return now + self.interval
+        rnd = self._random.random
+        if rnd() < self._disconnect:
+            self.close()
+            return None
+        if rnd() < self._stall:
+            return now + self._stall_time
+        data = self.frame()
+        if rnd() < self._broken:
+            pos = self._random.randrange(len(data) - 2)
+            data = data[:pos] + b'?' + data[pos+1:]
+        if rnd() < self._short:
+            data = data[:self._random.randrange(len(data) - 2)] + b'\r\n'
+        try:
+            os.write(self._master, data)
+            self._frames += 1
+        except BlockingIOError:
+            pass  # nobody reads the TTY, drop the frame
+        return now + self.interval
+
+    def close(self):
+        """Disconnect the device"""
+        if self._connected:
+            self._connected = False
+            self._running = False
+            os.close(self._master)
+            os.close(self._slave)
+
+
+class Simulator(threading.Thread):
+    """Serves any number of virtual CHY506R devices from a single thread"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._devices = []
+            self._added = []
+            self._break = False
+            self._wakeup_r, self._wakeup_w = os.pipe()
+        _simulators.add(self)
+
+    @property
+    def devices(self):
+        """Devices served by the simulator"""
+        with self._lock:
+            return tuple(self._devices)
+
+    def paths(self):
+        """Returns paths to TTYs of connected devices"""
+        return [device.path for device in self.devices if device.connected]
+
+    def add(self, count=None, **kw):
+        """Create virtual device (or count of them) with parameters as for
+        VirtualDevice. Returns the device (or list of devices)"""
+        devices = [VirtualDevice(**kw) for _ in range(count or 1)]
+        for device in devices:
+            self.attach(device)
+        return devices if count is not None else devices[0]
+
+    def attach(self, device):
+        """Serve already created device (e.g. of VirtualDevice subclass)"""
+        with self._lock:
+            self._devices.append(device)
+            self._added.append(device)
+            if self._wakeup_w is not None:
+                os.write(self._wakeup_w, b'\0')
+
+    def stop(self):
+        """Stop the simulator and disconnect all devices"""
+        with self._lock:
+            self._break = True
+            if self._wakeup_w is not None:
+                os.write(self._wakeup_w, b'\0')
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        schedule = []  # heap of (due, seq, device)
+        seq = itertools.count()
+        try:
+            while True:
+                with self._lock:
+                    if self._break:
+                        break
+                    added, self._added = self._added, []
+                now = time.monotonic()
+                for device in added:
+                    selector.register(device, selectors.EVENT_READ, device)
+                    heapq.heappush(schedule, (now + device.interval, next(seq), device))
+                timeout = max(schedule[0][0] - now, 0) if schedule else None
+                for key, _ in selector.select(timeout):
+                    if key.data is None:
+                        os.read(self._wakeup_r, 1024)
+                    else:
+                        key.data.receive()
+                now = time.monotonic()
+                while schedule and schedule[0][0] <= now:
+                    _, _, device = heapq.heappop(schedule)
+                    due = device.send(now)
+                    if due is None:
+                        selector.unregister(device)
+                    else:
+                        heapq.heappush(schedule, (due, next(seq), device))
+        finally:
+            selector.close()
+            for device in self.devices:
+                device.close()
+            with self._lock:
+                os.close(self._wakeup_r)
+                os.close(self._wakeup_w)
+                self._wakeup_r = self._wakeup_w = None
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
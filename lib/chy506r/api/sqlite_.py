@@ -0,0 +1,162 @@
+# -*- coding: utf8 -*-
+
+import collections
+import sqlite3
+import time
+
+from .index_ import parse_time
+from .sample_ import Timeline
+from .writer_ import Writer
+
+__all__ = ('SqliteWriter', 'SampleDatabase', 'Session')
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    device TEXT,
+    started REAL NOT NULL,  -- host time (Unix) the session started
+    date TEXT NOT NULL      -- local date of the first day of the session
+);
+CREATE TABLE IF NOT EXISTS samples (
+    session INTEGER NOT NULL REFERENCES sessions(id),
+    time INTEGER NOT NULL,  -- seconds since midnight of the first day
+    t1 REAL NOT NULL,
+    t2 REAL NOT NULL,
+    status TEXT,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session, time)
+) WITHOUT ROWID;
+"""
+
+_insert = "INSERT OR REPLACE INTO samples (session, time, t1, t2, status, count) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class Session(collections.namedtuple('Session', ('id', 'device', 'started', 'date', 'count',
+                                                 'first', 'last'))):
+    """Recording session in a SampleDatabase: id, device, host start time
+    (Unix time), local date of its first day, number of samples and time
+    of the first and the last one (seconds since midnight of the first
+    day)"""
+
+    __slots__ = ()
+
+
+class SqliteWriter(Writer):
+    """Writes samples into a SQLite database.
+
+    Each recording (begin()) is a new session; samples are stored in a
+    single table keyed by (session, time), so time ranges of a session are
+    read through the primary key index (see SampleDatabase). The database
+    runs in WAL mode, so readers don't block the writer. Buffered samples
+    are inserted in one transaction per flush, as decided by the
+    FlushPolicy; with fsync=True commits are synchronous (FULL)."""
+
+    def __init__(self, conn, policy=None, close=True, device=None):
+        super().__init__(conn, policy, close)
+        self._device = device
+        self._session = None
+        self._timeline = Timeline()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=%s" % ('FULL' if self.policy.fsync else 'NORMAL'))
+        conn.executescript(_schema)
+
+    @classmethod
+    def open(cls, path, policy=None, device=None):
+        """Open (or create) database at path, sessions get labelled with
+        device (TTY name)"""
+        if path == '-':
+            raise ValueError("SQLite output can't be written to stdout")
+        return cls(sqlite3.connect(path, check_same_thread=False), policy, device=device)
+
+    @property
+    def session(self):
+        """Id of the current session"""
+        return self._session
+
+    def begin(self):
+        """Start a new session"""
+        with self._file:
+            cursor = self._file.execute("INSERT INTO sessions (device, started, date) VALUES (?, ?, ?)",
+                                        (self._device, time.time(), time.strftime('%Y-%m-%d')))
+        self._session = cursor.lastrowid
+
+    def flush(self):
+        """Insert buffered samples in a single transaction"""
+        if self._pending:
+            with self._file:
+                self._file.executemany(_insert, self._pending)
+            self._pending = []
+
+    def _format(self, sample):
+        return (self._session, self._timeline.unwrap(sample.seconds), sample.t1, sample.t2,
+                sample.status, sample.count)
+
+
+class SampleDatabase(object):
+    """Reader of databases written by SqliteWriter"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def sessions(self):
+        """Returns list of Session, oldest first"""
+        rows = self._conn.execute(
+            "SELECT s.id, s.device, s.started, s.date, COUNT(p.time), MIN(p.time), MAX(p.time) "
+            "FROM sessions s LEFT JOIN samples p ON p.session = s.id GROUP BY s.id ORDER BY s.id")
+        return [Session(*row) for row in rows]
+
+    def last_session(self):
+        """Returns id of the most recent session, None if there's none"""
+        return self._conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0]
+
+    def query(self, start=None, stop=None, session=None):
+        """Returns list of (seconds, t1, t2) rows of session (by default the
+        most recent one) with start <= seconds < stop, see parse_time()"""
+        start, stop = parse_time(start), parse_time(stop)
+        if session is None:
+            session = self.last_session()
+        sql = "SELECT time, t1, t2 FROM samples WHERE session = ?"
+        args = [session]
+        if start is not None:
+            sql += " AND time >= ?"
+            args.append(start)
+        if stop is not None:
+            sql += " AND time < ?"
+            args.append(stop)
+        return self._conn.execute(sql + " ORDER BY time", args).fetchall()
+
+    def tail(self, rows, session=None):
+        """Returns list of the last rows (seconds, t1, t2) of session"""
+        if session is None:
+            session = self.last_session()
+        result = self._conn.execute("SELECT time, t1, t2 FROM samples WHERE session = ? "
+                                    "ORDER BY time DESC LIMIT ?", (session, rows)).fetchall()
+        result.reverse()
+        return result
+
+    def since(self, seconds, session=None):
+        """Returns list of (seconds, t1, t2) rows of session after seconds"""
+        if session is None:
+            session = self.last_session()
+        return self._conn.execute("SELECT time, t1, t2 FROM samples WHERE session = ? AND time > ? "
+                                  "ORDER BY time", (session, seconds)).fetchall()
+
+    def execute(self, sql, args=()):
+        """Run an ad-hoc query, returns cursor"""
+        return self._conn.execute(sql, args)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,525 @@
+# -*- coding: utf8 -*-
+
+import bisect
+import collections
+import math
+import os
+import threading
+import warnings
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .binlog_ import BinaryLog
+from .index_ import _parse_row
+from .sample_ import Timeline
+from .sqlite_ import SampleDatabase
+
+__all__ = ('QuantileSketch', 'ChannelStats', 'LogStatistics', 'read_chunks', 'analyze', 'QUANTILES',
+           'RunningStats', 'LiveStatistics', 'ChannelSnapshot', 'StatsSnapshot')
+
+
+CHUNK = 65536
+WINDOWS = (60, 600)
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+_ROW_BYTES = 28  # typical length of a CSV row, to size reads
+
+
+class QuantileSketch(object):
+    """Approximate quantiles of a stream in bounded memory.
+
+    Values are counted in bins of width resolution, so quantiles are exact
+    up to resolution / 2 and memory depends only on the range of values
+    (a few thousand bins for temperatures at 0.1 °C), not on their number.
+    Sketches of parts of a stream can be merged."""
+
+    def __init__(self, resolution=0.1):
+        self._resolution = resolution
+        self._bins = {}
+        self._count = 0
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+    @property
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        """Number of non-empty bins"""
+        return len(self._bins)
+
+    def update(self, values):
+        """Add sequence of values"""
+        bins = self._bins
+        if numpy is not None:
+            keys = numpy.floor(numpy.asarray(values, dtype=float) / self._resolution).astype(numpy.int64)
+            if not len(keys):
+                return
+            low, high = keys.min(), keys.max()
+            if high - low <= 4 * len(keys) + 1024:
+                counts = numpy.bincount(keys - low)
+                keys = numpy.flatnonzero(counts)
+                counts = counts[keys]
+                keys += low
+            else:  # outliers, don't allocate the whole range
+                keys, counts = numpy.unique(keys, return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                bins[key] = bins.get(key, 0) + count
+            self._count += int(counts.sum())
+        else:
+            for value in values:
+                key = int(math.floor(value / self._resolution))
+                bins[key] = bins.get(key, 0) + 1
+                self._count += 1
+
+    def merge(self, other):
+        """Add counts of another sketch of the same resolution"""
+        if other.resolution != self._resolution:
+            raise ValueError("can't merge sketches of different resolution")
+        for key, count in other._bins.items():
+            self._bins[key] = self._bins.get(key, 0) + count
+        self._count += other.count
+
+    def quantiles(self, qs):
+        """Returns list of values at quantiles qs (0 <= q <= 1), None if
+        the sketch is empty"""
+        if not self._count:
+            return [None for _ in qs]
+        keys = sorted(self._bins)
+        cumulative = []
+        total = 0
+        for key in keys:
+            total += self._bins[key]
+            cumulative.append(total)
+        result = []
+        for q in qs:
+            rank = min(int(q * self._count), self._count - 1)
+            i = bisect.bisect_right(cumulative, rank)
+            result.append((keys[i] + 0.5) * self._resolution)
+        return result
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+class ChannelStats(object):
+    """Statistics of a single channel updated chunk by chunk in constant
+    memory: count, min and max (with their time), mean and variance
+    (merged per chunk as in Chan et al.), approximate quantiles (see
+    QuantileSketch) and the maximum rate of change in °C/min, measured
+    over ramp_window seconds (only the last ramp_window seconds of samples
+    are kept between chunks)."""
+
+    def __init__(self, ramp_window=60, resolution=0.1):
+        self._ramp_window = ramp_window
+        self._sketch = QuantileSketch(resolution)
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = self._max = None
+        self._min_time = self._max_time = None
+        self._ramp = None
+        self._ramp_time = None
+        self._tail = ([], [])
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def min_time(self):
+        """Time (seconds) of the first occurrence of min"""
+        return self._min_time
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def max_time(self):
+        """Time (seconds) of the first occurrence of max"""
+        return self._max_time
+
+    @property
+    def mean(self):
+        return self._mean if self._count else None
+
+    @property
+    def variance(self):
+        """Sample variance"""
+        return self._m2 / (self._count - 1) if self._count > 1 else None
+
+    @property
+    def stddev(self):
+        variance = self.variance
+        return None if variance is None else math.sqrt(variance)
+
+    @property
+    def max_ramp(self):
+        """Steepest change (°C/min, signed) over ramp_window seconds"""
+        return self._ramp
+
+    @property
+    def max_ramp_time(self):
+        """Time (seconds) at the end of the window of max_ramp"""
+        return self._ramp_time
+
+    @property
+    def sketch(self):
+        return self._sketch
+
+    def quantiles(self, qs=QUANTILES):
+        """Returns list of approximate values at quantiles qs"""
+        values = self._sketch.quantiles(qs)
+        if self._count:
+            values = [min(max(v, self._min), self._max) for v in values]
+        return values
+
+    def update(self, seconds, values):
+        """Add chunk of samples: seconds (ascending) and values"""
+        if numpy is not None:
+            self._update_numpy(numpy.asarray(seconds, dtype=numpy.int64),
+                               numpy.asarray(values, dtype=float))
+        else:
+            self._update_python(list(seconds), list(values))
+
+    def summary(self, qs=QUANTILES):
+        """Returns ordered dict of all statistics"""
+        result = collections.OrderedDict((
+            ('count', self._count),
+            ('min', self._min),
+            ('min_time', self._min_time),
+            ('max', self._max),
+            ('max_time', self._max_time),
+            ('mean', self.mean),
+            ('stddev', self.stddev),
+            ('max_ramp', self._ramp),
+            ('max_ramp_time', self._ramp_time),
+        ))
+        result['quantiles'] = collections.OrderedDict(zip(qs, self.quantiles(qs)))
+        return result
+
+    def _moments(self, n, mean, m2):
+        total = self._count + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta * delta * self._count * n / total
+        self._count = total
+
+    def _extremes(self, low, low_time, high, high_time):
+        if self._min is None or low < self._min:
+            self._min, self._min_time = low, low_time
+        if self._max is None or high > self._max:
+            self._max, self._max_time = high, high_time
+
+    def _ramped(self, rate, when):
+        if self._ramp is None or abs(rate) > abs(self._ramp):
+            self._ramp, self._ramp_time = rate, when
+
+    def _update_numpy(self, x, y):
+        finite = numpy.isfinite(y)
+        if not finite.all():
+            x, y = x[finite], y[finite]
+        if not len(y):
+            return
+        mean = y.mean()
+        self._moments(len(y), float(mean), float(numpy.square(y - mean).sum()))
+        low, high = y.argmin(), y.argmax()
+        self._extremes(float(y[low]), int(x[low]), float(y[high]), int(x[high]))
+        self._sketch.update(y)
+        # ramp against the last sample at or before window start, carried over
+        # from previous chunks if needed
+        start = len(self._tail[0])
+        if start:
+            tx = numpy.concatenate((self._tail[0], x))
+            ty = numpy.concatenate((self._tail[1], y))
+        else:
+            tx, ty = x, y
+        j = numpy.searchsorted(tx, tx[start:] - self._ramp_window, 'right') - 1
+        valid = j >= 0
+        if valid.any():
+            i = numpy.flatnonzero(valid) + start
+            j = j[valid]
+            rates = (ty[i] - ty[j]) / (tx[i] - tx[j]) * 60.0
+            k = numpy.abs(rates).argmax()
+            self._ramped(float(rates[k]), int(tx[i[k]]))
+        keep = max(numpy.searchsorted(tx, tx[-1] - self._ramp_window, 'right') - 1, 0)
+        self._tail = (tx[keep:].copy(), ty[keep:].copy())
+
+    def _update_python(self, x, y):
+        pairs = [(s, v) for s, v in zip(x, y) if math.isfinite(v)]
+        if not pairs:
+            return
+        x, y = [p[0] for p in pairs], [p[1] for p in pairs]
+        mean = sum(y) / len(y)
+        self._moments(len(y), mean, sum((v - mean) ** 2 for v in y))
+        low = min(range(len(y)), key=y.__getitem__)
+        high = max(range(len(y)), key=y.__getitem__)
+        self._extremes(y[low], x[low], y[high], x[high])
+        self._sketch.update(y)
+        tx, ty = list(self._tail[0]) + x, list(self._tail[1]) + y
+        j = -1
+        for i in range(len(self._tail[0]), len(tx)):
+            while j + 1 < i and tx[j + 1] <= tx[i] - self._ramp_window:
+                j += 1
+            if j >= 0 and tx[j] <= tx[i] - self._ramp_window:
+                self._ramped((ty[i] - ty[j]) / (tx[i] - tx[j]) * 60.0, tx[i])
+        keep = 0
+        while keep + 1 < len(tx) and tx[keep + 1] <= tx[-1] - self._ramp_window:
+            keep += 1
+        self._tail = (tx[keep:], ty[keep:])
+
+
+class LogStatistics(object):
+    """Statistics of both channels of a log (see ChannelStats)"""
+
+    CHANNELS = ('t1', 't2')
+
+    def __init__(self, ramp_window=60, resolution=0.1):
+        self._channels = collections.OrderedDict(
+            (name, ChannelStats(ramp_window, resolution)) for name in self.CHANNELS)
+        self._first = self._last = None
+
+    @property
+    def channels(self):
+        """Ordered dict of ChannelStats by channel name"""
+        return self._channels
+
+    @property
+    def first(self):
+        """Time (seconds) of the first sample"""
+        return self._first
+
+    @property
+    def last(self):
+        """Time (seconds) of the last sample"""
+        return self._last
+
+    def __getitem__(self, channel):
+        return self._channels[channel]
+
+    def update(self, seconds, t1, t2):
+        """Add chunk of samples (see read_chunks())"""
+        if not len(seconds):
+            return
+        if self._first is None:
+            self._first = int(seconds[0])
+        self._last = int(seconds[-1])
+        self._channels['t1'].update(seconds, t1)
+        self._channels['t2'].update(seconds, t2)
+
+    def summary(self, qs=QUANTILES):
+        result = collections.OrderedDict((('first', self._first), ('last', self._last)))
+        for name, stats in self._channels.items():
+            result[name] = stats.summary(qs)
+        return result
+
+
+class ChannelSnapshot(collections.namedtuple('ChannelSnapshot', (
+        'count', 'last', 'min', 'min_time', 'max', 'max_time', 'mean', 'stddev', 'rates'))):
+    """Running statistics of a channel at some point: number of values,
+    the last one, min and max with their time (seconds since midnight of
+    the first day), mean, stddev (None for less than 2 values) and rates,
+    a dict of the rate of change (°C/min) by window length in seconds (None
+    until the window is filled)"""
+
+    __slots__ = ()
+
+
+class StatsSnapshot(collections.namedtuple('StatsSnapshot', ('time', 'count', 't1', 't2'))):
+    """Consistent snapshot of LiveStatistics: time of the last sample
+    (seconds since midnight of the first day, None before the first one),
+    number of samples and ChannelSnapshot of each channel"""
+
+    __slots__ = ()
+
+
+class RunningStats(object):
+    """Statistics of a single channel updated value by value in O(1):
+    Welford's mean and variance, min and max with their time and the rate
+    of change over each of windows (seconds), measured against the last
+    value at or before the window start. Only values within the longest
+    window are kept."""
+
+    def __init__(self, windows=WINDOWS):
+        self._windows = tuple(windows)
+        self._history = [collections.deque() for _ in self._windows]
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._last = None
+        self._min = self._max = None
+        self._min_time = self._max_time = None
+
+    @property
+    def windows(self):
+        return self._windows
+
+    def add(self, seconds, value):
+        """Add value measured at seconds (non-decreasing)"""
+        if not math.isfinite(value):
+            return
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        self._last = value
+        if self._min is None or value < self._min:
+            self._min, self._min_time = value, seconds
+        if self._max is None or value > self._max:
+            self._max, self._max_time = value, seconds
+        for window, history in zip(self._windows, self._history):
+            history.append((seconds, value))
+            while len(history) > 1 and history[1][0] <= seconds - window:
+                history.popleft()
+
+    def rate(self, window):
+        """Rate of change (°C/min) over window (one of windows), None until
+        the window is filled"""
+        history = self._history[self._windows.index(window)]
+        if not history:
+            return None
+        (start, first), (end, last) = history[0], history[-1]
+        if start > end - window:
+            return None
+        return (last - first) / (end - start) * 60.0
+
+    def snapshot(self):
+        """Returns ChannelSnapshot"""
+        stddev = math.sqrt(self._m2 / (self._count - 1)) if self._count > 1 else None
+        return ChannelSnapshot(self._count, self._last, self._min, self._min_time, self._max,
+                               self._max_time, self._mean if self._count else None, stddev,
+                               collections.OrderedDict((w, self.rate(w)) for w in self._windows))
+
+
+class LiveStatistics(object):
+    """Running statistics of both channels of a device, maintained by the
+    acquisition (see Recorder) as samples arrive. add() and snapshot() may
+    be called from different threads; snapshots are consistent."""
+
+    def __init__(self, windows=WINDOWS):
+        self._lock = threading.RLock()
+        self._timeline = Timeline()
+        self._channels = (RunningStats(windows), RunningStats(windows))
+        self._time = None
+        self._count = 0
+
+    def add(self, sample):
+        """Update statistics with sample"""
+        with self._lock:
+            self._time = seconds = self._timeline.unwrap(sample.seconds)
+            self._count += 1
+            self._channels[0].add(seconds, sample.t1)
+            self._channels[1].add(seconds, sample.t2)
+
+    def snapshot(self):
+        """Returns StatsSnapshot of the current state"""
+        with self._lock:
+            return StatsSnapshot(self._time, self._count, *(c.snapshot() for c in self._channels))
+
+
+def _columns(rows):
+    """Turn list of (seconds, t1, t2) rows into columns"""
+    if numpy is not None:
+        array = numpy.array(rows, dtype=float).reshape(-1, 3)
+        return (array[:, 0].astype(numpy.int64), array[:, 1], array[:, 2])
+    return tuple(list(c) for c in zip(*rows)) if rows else ([], [], [])
+
+
+def _csv_columns(block, timeline):
+    """Parse block of complete CSV lines into columns, vectorized if the
+    block is clean (no header or damaged lines)"""
+    if block.startswith(b'TIME'):
+        block = block.partition(b'\n')[2]
+    lines = block.count(b'\n')
+    if numpy is not None and lines:
+        text = block.replace(b':', b';').replace(b'\n', b';').rstrip(b';')
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)  # damaged line
+                values = numpy.fromstring(text, sep=';')
+        except ValueError:  # damaged line (NumPy 2)
+            values = ()
+        if len(values) == 5 * lines:
+            values = values.reshape(-1, 5)
+            seconds = values[:, 0].astype(numpy.int64) * 3600 + values[:, 1].astype(numpy.int64) * 60 \
+                + values[:, 2].astype(numpy.int64)
+            return (timeline.unwrap_all(seconds), values[:, 3], values[:, 4])
+    rows = [row for row in (_parse_row(line, timeline) for line in block.splitlines()) if row]
+    return _columns(rows)
+
+
+def _read_csv(path, rows):
+    timeline = Timeline()
+    size = max(rows * _ROW_BYTES, 4096)
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            data = f.read(size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            block, rest = data[:end], data[end:]
+            if block:
+                yield _csv_columns(block, timeline)
+        if rest.strip():
+            yield _csv_columns(rest + b'\n', timeline)
+
+
+def _read_binary(path, rows):
+    with BinaryLog(path) as log:
+        for start in range(0, len(log), rows):
+            records = log.records[start:start+rows]
+            if numpy is not None:
+                yield (records['time'].astype(numpy.int64), records['t1'], records['t2'])
+            else:
+                yield _columns([r[:3] for r in records])
+
+
+def _read_sqlite(path, rows, session):
+    with SampleDatabase(path) as db:
+        if session is None:
+            session = db.last_session()
+        cursor = db.execute("SELECT time, t1, t2 FROM samples WHERE session = ? ORDER BY time", (session,))
+        while True:
+            chunk = cursor.fetchmany(rows)
+            if not chunk:
+                break
+            yield _columns(chunk)
+
+
+def read_chunks(path, rows=CHUNK, session=None):
+    """Stream log written by Chy506R (CSV, binary log or SQLite database,
+    by extension) as chunks of about rows samples. Yields (seconds, t1, t2)
+    column tuples (NumPy arrays, or lists without NumPy), seconds counted
+    from midnight of the first day. For SQLite, session defaults to the
+    most recent one"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.bin':
+        return _read_binary(path, rows)
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return _read_sqlite(path, rows, session)
+    return _read_csv(path, rows)
+
+
+def analyze(path, ramp_window=60, resolution=0.1, rows=CHUNK, session=None):
+    """Compute LogStatistics of a log in a single pass"""
+    stats = LogStatistics(ramp_window, resolution)
+    for seconds, t1, t2 in read_chunks(path, rows, session):
+        stats.update(seconds, t1, t2)
+    return stats
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
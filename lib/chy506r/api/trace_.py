@@ -0,0 +1,128 @@
+# -*- coding: utf8 -*-
+
+import collections
+import time
+
+__all__ = ('Trace', 'Tracer')
+
+
+_header = "TIME;WALL;FIRST_ARRIVAL;LAST_ARRIVAL;COMPLETED;PARSED;AGGREGATED;WRITTEN;DISPLAYED\n"
+
+
+class Trace(object):
+    """Host timestamps of a sample on its way through the pipeline.
+
+    Monotonic timestamps (time.monotonic()) of arrival of the first and the
+    last frame averaged into the sample, of arrival and parsing of the frame
+    which completed the sample (the first one of the next second), of
+    aggregation, of the flush to the output (which may be several samples
+    later, see FlushPolicy) and of the display (set by the consumer showing
+    the sample, e.g. LivePlotter), None for stages not (yet) reached. wall
+    is the host clock (time.time()) at aggregation."""
+
+    __slots__ = ('first_arrival', 'last_arrival', 'completed', 'parsed', 'aggregated',
+                 'written', 'displayed', 'wall')
+
+    def __init__(self, first_arrival=None, last_arrival=None, completed=None, parsed=None):
+        self.first_arrival = first_arrival
+        self.last_arrival = last_arrival
+        self.completed = completed
+        self.parsed = parsed
+        self.aggregated = time.monotonic()
+        self.written = None
+        self.displayed = None
+        self.wall = time.time()
+
+    def spans(self):
+        """Returns dict of durations (seconds) between consecutive stages:
+        'bucket' (first to last frame), 'wait' (last frame to the frame
+        completing the sample), 'parse', 'aggregate', 'write' (until flushed)
+        and 'display'. Consumers get samples regardless of flushing, so
+        'display' is measured from aggregation"""
+        stages = (('bucket', self.first_arrival, self.last_arrival),
+                  ('wait', self.last_arrival, self.completed),
+                  ('parse', self.completed, self.parsed),
+                  ('aggregate', self.parsed, self.aggregated),
+                  ('write', self.aggregated, self.written),
+                  ('display', self.aggregated, self.displayed))
+        return collections.OrderedDict((name, b - a) for name, a, b in stages
+                                       if a is not None and b is not None)
+
+    def drift(self, seconds):
+        """Host clock minus device clock (device time of the sample as
+        seconds since midnight), in seconds. Samples are labelled with the
+        time of the frame completing them, so this includes serial latency
+        and the sub-second part of the host clock"""
+        lt = time.localtime(self.wall)
+        wall = lt.tm_hour * 3600 + lt.tm_min * 60 + lt.tm_sec + self.wall % 1
+        return (wall - seconds + 43200) % 86400 - 43200
+
+
+class Tracer(object):
+    """Collects traces of samples (see Trace) while tracing is enabled in
+    Chy506R.
+
+    Traces of the last keep samples are kept for summary(). If path is
+    given, one line per sample is written to that file, delay samples
+    later, so that consumers have time to stamp display."""
+
+    def __init__(self, path=None, keep=3600, delay=10):
+        self._samples = collections.deque(maxlen=keep)
+        self._unwritten = collections.deque()
+        self._delay = delay
+        self._file = None
+        if path is not None:
+            self._file = open(path, 'wt')
+            self._file.write(_header)
+
+    @property
+    def samples(self):
+        """Traced samples kept"""
+        return tuple(self._samples)
+
+    def add(self, sample):
+        """Record traced sample (called by the acquisition)"""
+        self._samples.append(sample)
+        if self._file is not None:
+            self._unwritten.append(sample)
+            while len(self._unwritten) > self._delay:
+                self._write(self._unwritten.popleft())
+
+    def summary(self):
+        """Returns dict with count, mean and max of each span and of drift
+        over the kept samples"""
+        values = collections.OrderedDict()
+        for sample in tuple(self._samples):
+            trace = sample.trace
+            for name, value in trace.spans().items():
+                values.setdefault(name, []).append(value)
+            values.setdefault('drift', []).append(trace.drift(sample.seconds))
+        return collections.OrderedDict(
+            (name, {'count': len(v), 'mean': sum(v) / len(v), 'max': max(v)})
+            for name, v in values.items())
+
+    def close(self):
+        if self._file is not None:
+            while self._unwritten:
+                self._write(self._unwritten.popleft())
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, sample):
+        trace = sample.trace
+        fields = [trace.first_arrival, trace.last_arrival, trace.completed, trace.parsed,
+                  trace.aggregated, trace.written, trace.displayed]
+        self._file.write("%02d:%02d:%02d;%.6f;%s\n" % (sample.time + (trace.wall, ';'.join(
+            '' if t is None else '%.6f' % t for t in fields))))
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,235 @@
+# -*- coding: utf8 -*-
+
+import os
+import sys
+import time
+
+from .index_ import EVERY, IndexWriter, index_path
+from .sample_ import Timeline
+
+__all__ = ('FlushPolicy', 'Writer', 'CsvWriter', 'TeeWriter')
+
+
+class FlushPolicy(object):
+    """Decides when buffered samples get written to disk.
+
+    Buffer is flushed when it holds every samples, or when interval
+    seconds elapsed since the last flush (whichever comes first). With
+    fsync=True each flush is followed by os.fsync() for durability."""
+
+    def __init__(self, every=1, interval=None, fsync=False):
+        self._every = every
+        self._interval = interval
+        self._fsync = fsync
+
+    @property
+    def every(self):
+        return self._every
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def fsync(self):
+        return self._fsync
+
+    def due(self, pending, since):
+        """Whether pending samples buffered for since seconds should be
+        flushed now"""
+        if not pending:
+            return False
+        if self._every is not None and pending >= self._every:
+            return True
+        return self._interval is not None and since >= self._interval
+
+    def __repr__(self):
+        return 'FlushPolicy(every=%r, interval=%r, fsync=%r)' % (self._every, self._interval, self._fsync)
+
+
+class Writer(object):
+    """Base class for output writers.
+
+    Samples get formatted into records, which are buffered and written to
+    the underlying file according to the FlushPolicy. Subclasses implement
+    _header(), _format() and _join()."""
+
+    _mode = 'wt'
+
+    def __init__(self, file, policy=None, close=True):
+        self._file = file
+        self._policy = policy or FlushPolicy()
+        self._close = close
+        self._pending = []
+        self._since = time.monotonic()
+
+    @classmethod
+    def open(cls, path, policy=None):
+        """Open output file for writing (path '-' stands for stdout)"""
+        if path == '-':
+            return cls(cls._stdout(), policy, close=False)
+        return cls(open(path, cls._mode), policy)
+
+    @classmethod
+    def _stdout(cls):
+        return sys.stdout
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def pending(self):
+        """Number of buffered, not yet written records"""
+        return len(self._pending)
+
+    def begin(self):
+        """Write output file header"""
+        header = self._header()
+        if header:
+            self._file.write(header)
+
+    def write(self, sample):
+        """Buffer a sample, flush if required by the policy"""
+        if not self._pending:
+            self._since = time.monotonic()
+        self._pending.append(self._format(sample))
+        self.tick()
+
+    def tick(self):
+        """Flush if required by the policy; should be called periodically
+        when no samples arrive"""
+        if self._policy.due(len(self._pending), time.monotonic() - self._since):
+            self.flush()
+
+    def flush(self):
+        """Write out buffered records"""
+        if self._pending:
+            self._file.write(self._join(self._pending))
+            self._pending = []
+        self._file.flush()
+        if self._policy.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Flush buffered records and close the file"""
+        try:
+            self.flush()
+        finally:
+            if self._close:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CsvWriter(Writer):
+    """Writes samples as TIME;T1;T2 text lines.
+
+    Optionally maintains a sparse index sidecar (see IndexWriter) for
+    random access by time."""
+
+    def __init__(self, file, policy=None, close=True, index=None):
+        super().__init__(file, policy, close)
+        self._index = index
+        self._offset = 0
+        self._rows = 0
+        self._timeline = Timeline()
+
+    @classmethod
+    def open(cls, path, policy=None, index=EVERY):
+        """Open output file for writing (path '-' stands for stdout).
+
+        Unless index is None, the index sidecar gets an entry every index
+        rows."""
+        writer = super().open(path, policy)
+        if index and path != '-':
+            writer._index = IndexWriter(index_path(path), index)
+        return writer
+
+    def flush(self):
+        super().flush()
+        if self._index is not None:
+            self._index.flush()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._index is not None:
+                self._index.close()
+
+    def _header(self):
+        header = "TIME;T1;T2\n"
+        self._offset += len(header)
+        return header
+
+    def _format(self, sample):
+        h, m, s = sample.time
+        record = "%02d:%02d:%02d;%f;%f\n" % (h, m, s, sample.t1, sample.t2)
+        if self._index is not None:
+            seconds = self._timeline.unwrap(sample.seconds)
+            if self._rows % self._index.every == 0:
+                self._index.add(seconds, self._offset)
+            self._rows += 1
+            self._offset += len(record)
+        return record
+
+    def _join(self, records):
+        return ''.join(records)
+
+
+class TeeWriter(object):
+    """Passes samples to several writers (e.g. CSV and binary log)"""
+
+    def __init__(self, writers):
+        self._writers = list(writers)
+
+    @property
+    def writers(self):
+        return tuple(self._writers)
+
+    @property
+    def pending(self):
+        return max(w.pending for w in self._writers)
+
+    def begin(self):
+        for w in self._writers:
+            w.begin()
+
+    def write(self, sample):
+        for w in self._writers:
+            w.write(sample)
+
+    def tick(self):
+        for w in self._writers:
+            w.tick()
+
+    def flush(self):
+        for w in self._writers:
+            w.flush()
+
+    def close(self):
+        errors = []
+        for w in self._writers:
+            try:
+                w.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
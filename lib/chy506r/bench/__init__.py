@@ -0,0 +1,9 @@
+# -*- coding: utf8 -*-
+
+from .. import util
+util.import_all_from(__package__, [
+    '.benchmarks_',
+    '.runner_',
+], lazy=True)
+
+# vim: set ft=python et ts=4 sw=4:
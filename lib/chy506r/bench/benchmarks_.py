@@ -0,0 +1,291 @@
+# -*- coding: utf8 -*-
+"""Benchmarks of the acquisition, storage and plotting pipeline.
+"""
+
+import bisect
+import collections
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .. import api
+from ..api import parser_
+
+__all__ = ('benchmark', 'benchmarks', 'result')
+
+
+_benchmarks = collections.OrderedDict()
+
+
+def benchmark(name):
+    """Decorator registering a benchmark function under given name.
+
+    The function gets keyword arguments given to the runner (like
+    quick=True) and returns list of results (see result())."""
+    def decorator(func):
+        _benchmarks[name] = func
+        return func
+    return decorator
+
+
+def benchmarks():
+    """Returns ordered dict of registered benchmarks"""
+    return _benchmarks
+
+
+def result(name, value, unit, **params):
+    """Create single benchmark result"""
+    return {'name': name, 'value': value, 'unit': unit, 'params': params}
+
+
+def _frames(count, seed=0):
+    """Returns count frames (with line terminators) as a single bytes object"""
+    rnd = random.Random(seed)
+    frames = []
+    for i in range(count):
+        t1, t2 = rnd.randint(-99999, 999999), rnd.randint(-99999, 999999)
+        h, m, s = (i // 3600 // 3) % 24, (i // 60 // 3) % 60, (i // 3) % 60
+        frames.append("%s%06X0%s%06X0%02d%02d%02d00000000\r\n" % (
+            '-' if t1 < 0 else '+', abs(t1), '-' if t2 < 0 else '+', abs(t2), h, m, s))
+    return ''.join(frames).encode()
+
+
+def _best(func, repeat):
+    """Returns the best wall time of repeat calls to func"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@benchmark('parser')
+def bench_parser(quick=False, **kw):
+    """Throughput of parse_frames() (NumPy and pure-Python) and of the whole
+    Framer + Recorder pipeline"""
+    count = 10000 if quick else 200000
+    data = _frames(count)
+    results = []
+    modes = [False] + ([True] if parser_.numpy is not None else [])
+    for use_numpy in modes:
+        elapsed = _best(lambda: api.parse_frames(data, stride=32, use_numpy=use_numpy), 3)
+        results.append(result('parser.parse_frames', count / elapsed, 'frames/s',
+                              numpy=use_numpy, frames=count))
+
+    def pipeline():
+        with api.CsvWriter.open(os.devnull) as out:
+            recorder, framer = api.Recorder(out), api.Framer()
+            for i in range(0, len(data), 4096):
+                recorder.feed(framer.feed(data[i:i+4096]))
+    elapsed = _best(pipeline, 3)
+    results.append(result('parser.pipeline', count / elapsed, 'frames/s', frames=count))
+    return results
+
+
+@benchmark('writer')
+def bench_writer(quick=False, **kw):
+    """Throughput of writing averaged samples to a file under different
+    flush policies"""
+    count = 3000 if quick else 30000
+    data = _frames(count * 3)  # 3 frames per second
+    framer = api.Framer()
+    frames = framer.feed(data)
+    policies = [
+        api.FlushPolicy(every=1),
+        api.FlushPolicy(every=1, fsync=True),
+        api.FlushPolicy(every=60),
+        api.FlushPolicy(every=None, interval=1.0),
+        api.FlushPolicy(every=60, fsync=True),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'out.csv')
+        for policy in policies:
+            n = count // 10 if policy.fsync and policy.every == 1 else count
+
+            def write():
+                with api.CsvWriter.open(path, policy) as out:
+                    recorder = api.Recorder(out)
+                    recorder.begin()
+                    for i in range(0, n * 3, 3):
+                        recorder.feed(frames[i:i+3])
+            elapsed = _best(write, 3)
+            results.append(result('writer.samples', n / elapsed, 'samples/s', samples=n,
+                                  every=policy.every, interval=policy.interval, fsync=policy.fsync))
+    return results
+
+
+class _TimedOutput(api.CsvWriter):
+    """Writer recording monotonic time of each written sample"""
+
+    def __init__(self):
+        super().__init__(open(os.devnull, 'wt'))
+        self.stamps = []
+
+    def write(self, sample):
+        super().write(sample)
+        self.stamps.append(time.monotonic())
+
+
+class _TimedDevice(api.VirtualDevice):
+    """Virtual device recording monotonic time of each sent frame"""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.stamps = []
+
+    def send(self, now):
+        self.stamps.append(time.monotonic())
+        return super().send(now)
+
+
+class _TimedChy506R(api.Chy506R):
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.output = _TimedOutput()
+
+    def open_output(self):
+        return self.output
+
+
+@benchmark('latency')
+def bench_latency(quick=False, **kw):
+    """Latency between the frame completing a second being sent by
+    a simulated device and the averaged sample being written"""
+    duration = 4 if quick else 20
+    simulator = api.Simulator()
+    device = _TimedDevice(rate=4)
+    simulator.attach(device)
+    simulator.start()
+    try:
+        chy = _TimedChy506R(device.path, '-', timeout=2)
+        chy.start()
+        time.sleep(duration)
+        chy.stop()
+        chy.join()
+    finally:
+        simulator.stop()
+        simulator.join()
+    latencies = []
+    for stamp in chy.output.stamps:
+        i = bisect.bisect_right(device.stamps, stamp)
+        if i:
+            latencies.append(stamp - device.stamps[i - 1])
+    if not latencies:
+        return [result('latency.sample', None, 's', error='no samples')]
+    latencies.sort()
+    return [result('latency.sample', latencies[len(latencies) // 2], 's', stat='median', samples=len(latencies)),
+            result('latency.sample', latencies[-1], 's', stat='max', samples=len(latencies))]
+
+
+@benchmark('plot')
+def bench_plot(quick=False, gnuplot='gnuplot', **kw):
+    """Time gnuplot takes to draw a data file depending on its size (legacy
+    Plotter) and time of a LivePlotter redraw of a window of that size,
+    without and with decimation"""
+    sizes = (3600,) if quick else (3600, 6 * 3600, 24 * 3600)
+    found = shutil.which(gnuplot) is not None
+    results = []
+    for rows in sizes:
+        window = [(i, float(i % 300), float(300 - i % 300)) for i in range(rows)]
+        for method, points in ((None, None), ('minmax', 2000), ('lttb', 2000)):
+            plotter = api.LivePlotter(os.devnull, gnuplot, window=None, points=points, method=method)
+            plotter._window.extend(window)
+            elapsed = _best(plotter._plot, 1 if quick else 3)
+            results.append(result('plot.live.prepare', elapsed, 's', rows=rows, method=method))
+            if found:
+                text = 'set terminal unknown\n' + plotter._script() + plotter._plot()
+                elapsed = _best(lambda: subprocess.run([gnuplot], input=text, universal_newlines=True,
+                                                       check=True), 1 if quick else 3)
+                results.append(result('plot.live.draw', elapsed, 's', rows=rows, method=method))
+    if not found:
+        results.append(result('plot.refresh', None, 's', error='gnuplot not found'))
+        return results
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        for rows in sizes:
+            with open(path, 'wt') as f:
+                f.write("TIME;T1;T2\n")
+                for i in range(rows):
+                    f.write("%02d:%02d:%02d;%f;%f\n" % (i // 3600 % 24, i // 60 % 60, i % 60, i % 300, 300 - i % 300))
+            script = os.path.join(tmp, 'plot.gp')
+            with open(script, 'wt') as f:
+                f.write("set terminal unknown\n")
+                f.write(api.Plotter._script().replace('pause 1', '').replace('if(reread_loop==1) reread', ''))
+            cmd = [gnuplot, '-e', "file='%s'" % path, script]
+            elapsed = _best(lambda: subprocess.check_call(cmd), 1 if quick else 3)
+            results.append(result('plot.refresh', elapsed, 's', rows=rows))
+    return results
+
+
+@benchmark('stats')
+def bench_stats(quick=False, **kw):
+    """Throughput of the streaming statistics over CSV and binary logs"""
+    rows = 20000 if quick else 1000000
+    rnd = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in ('.csv', '.bin'):
+            path = os.path.join(tmp, 'log' + ext)
+            with api.open_output(path, api.FlushPolicy(every=10000)) as out:
+                out.begin()
+                for i in range(rows):
+                    s = i % 86400
+                    out.write(api.Sample((s // 3600, s // 60 % 60, s % 60), 20 + i * 0.001 + rnd.random(),
+                                         rnd.gauss(300, 5), None, 3))
+            size = os.path.getsize(path)
+            elapsed = _best(lambda: api.analyze(path), 1 if quick else 3)
+            results.append(result('stats.analyze', rows / elapsed, 'samples/s', format=ext[1:],
+                                  rows=rows, mb_per_s=round(size / elapsed / 1e6, 1)))
+    return results
+
+
+@benchmark('alarms')
+def bench_alarms(quick=False, **kw):
+    """Throughput of the alarm engine with many rules per device"""
+    count = 500 if quick else 5000
+    rnd = random.Random(0)
+    conditions = ('t1 > %d', 'abs(t1 - t2) > %d', 'rate(t1, 60) > %d', 't2 < %d and t1 > 5')
+    samples = [api.Sample((i // 3600 % 24, i // 60 % 60, i % 60), rnd.uniform(0, 300), rnd.uniform(0, 300),
+                          None, 3) for i in range(count)]
+    results = []
+    for rules in (10, 100, 500):
+        def evaluate():
+            engine = api.AlarmEngine([api.Rule('r%d' % i, conditions[i % len(conditions)] % rnd.randint(1, 200))
+                                      for i in range(rules)])
+            for sample in samples:
+                engine.feed(sample)
+        elapsed = _best(evaluate, 3)
+        results.append(result('alarms.samples', count / elapsed, 'samples/s', rules=rules))
+    return results
+
+
+@benchmark('startup')
+def bench_startup(quick=False, **kw):
+    """Cold start time of the package, of the GUI modules and of the GUI up
+    to its first window (if display available)"""
+    env = dict(os.environ)
+    lib = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join([lib] + [p for p in [env.get('PYTHONPATH')] if p])
+    # chy506r.ui imports its modules lazily, app_ pulls in the whole GUI
+    snippets = [('import chy506r.api', 'api'), ('import chy506r.ui.app_', 'ui')]
+    if os.environ.get('DISPLAY'):
+        snippets.append(('from chy506r.ui import App; App.ui.update(); App.tk.destroy()', 'window'))
+    results = []
+    for code, what in snippets:
+        cmd = [sys.executable, '-c', code]
+        elapsed = _best(lambda: subprocess.check_call(cmd, env=env), 1 if quick else 5)
+        results.append(result('startup', elapsed, 's', target=what))
+    return results
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
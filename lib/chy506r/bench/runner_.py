@@ -0,0 +1,78 @@
+# -*- coding: utf8 -*-
+"""Runs benchmarks and compares their results.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from .benchmarks_ import benchmarks
+
+__all__ = ('run', 'compare', 'main')
+
+
+def run(names=None, **kw):
+    """Run benchmarks (all, or these listed in names) and return a report
+    (a JSON-serializable dict)"""
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': [],
+    }
+    for name, func in benchmarks().items():
+        if names and name not in names:
+            continue
+        report['results'].extend(func(**kw))
+    return report
+
+
+def _key(result):
+    return (result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def compare(old, new):
+    """Compare two reports; returns list of (name, params, old, new, ratio)
+    tuples for results present in both"""
+    previous = dict((_key(r), r) for r in old['results'])
+    rows = []
+    for r in new['results']:
+        o = previous.get(_key(r))
+        if o is None or o['value'] is None or r['value'] is None:
+            continue
+        ratio = r['value'] / o['value'] if o['value'] else None
+        rows.append((r['name'], r['params'], o['value'], r['value'], ratio))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CHY506R pipeline")
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help="benchmarks to run (%s)" % ', '.join(benchmarks()))
+    parser.add_argument('-q', '--quick', action='store_true', help="smaller workloads")
+    parser.add_argument('-o', '--output', help="write JSON report to this file")
+    parser.add_argument('-c', '--compare', metavar='REPORT', help="compare with previous JSON report")
+    args = parser.parse_args(argv)
+
+    report = run(args.names, quick=args.quick)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'wt') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for name, params, o, n, ratio in compare(old, report):
+            sys.stderr.write("%-24s %-40s %12.6g -> %12.6g (x%.3f)\n" % (
+                name, json.dumps(params, sort_keys=True), o, n, ratio or 0))
+    return 0
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,228 @@
+# -*- coding: utf8 -*-
+"""Headless data logger, records measurements without the GUI.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+from .. import api
+
+__all__ = ('Logger', 'output_path', 'main')
+
+
+FORMATS = ('csv', 'bin', 'db')
+
+
+def output_path(template, tty, format=None):
+    """Returns output path for device at tty: '{tty}' in template is
+    replaced with the TTY name and the format extension is appended if
+    missing"""
+    path = template.replace('{tty}', os.path.basename(tty))
+    if format is not None and path != '-' and \
+       os.path.splitext(path)[1].lower() != '.' + format:
+        path += '.' + format
+    return path
+
+
+class Logger(object):
+    """Records measurements from one or more devices until stopped.
+
+    Devices are read by a single DevicePool thread, so any number of them
+    can be recorded without a thread per port. The logger stops when
+    stop() is called (e.g. from a signal handler), when duration seconds
+    elapse, or when all devices stop on their own.
+
+    If serve is given as (host, port), samples of each device are served
+    over HTTP (see SampleServer), the i-th device on port + i (on any free
+    port if port is 0). If traces (list of paths, one per device) is given,
+    samples are traced (see Tracer). If alarms (an AlarmEngine) is given,
+    its rules are evaluated on samples of all devices, alarms are reported
+    to stderr."""
+
+    def __init__(self, ttys, outputs, duration=None, flush=None, rollups=None, verbose=False,
+                 serve=None, traces=None, alarms=None):
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._duration = duration
+        self._verbose = verbose
+        self._ttys = list(ttys)
+        self._pool = api.DevicePool(flush=flush)
+        self._devices = []
+        self._servers = []
+        self._alarms = alarms
+        if alarms is not None:
+            alarms.add_action(self._alarm)
+        for i, (tty, output) in enumerate(zip(ttys, outputs)):
+            bus = api.SampleBus() if serve is not None or alarms is not None else None
+            tracer = api.Tracer(traces[i]) if traces is not None else None
+            device = self._pool.add(tty, output, rollups=rollups, listener=self._listener(tty), bus=bus,
+                                    tracer=tracer)
+            self._devices.append(device)
+            if serve is not None:
+                # port 0 lets the system pick a free port for each device
+                port = serve[1] + i if serve[1] else 0
+                self._servers.append(api.SampleServer(bus, serve[0], port, metrics=device.metrics))
+            if alarms is not None:
+                alarms.attach(bus, tty)
+        self._running = 0
+
+    @property
+    def devices(self):
+        """Devices of the pool (PoolDevice), one per TTY"""
+        return tuple(self._devices)
+
+    @property
+    def servers(self):
+        """SampleServers, one per device, if serving"""
+        return tuple(self._servers)
+
+    @property
+    def done(self):
+        """Whether all devices finished measurements as requested"""
+        return all(device.done for device in self._devices)
+
+    def stop(self):
+        """Request all devices to stop; safe to call from signal handlers"""
+        self._stopped.set()
+
+    def run(self):
+        """Record until stopped. Returns True if all devices finished
+        measurements as requested"""
+        with self._lock:
+            self._running = len(self._devices)
+        for tty, server in zip(self._ttys, self._servers):
+            server.start()
+            if self._verbose:
+                sys.stderr.write("%s -> %s\n" % (tty, server.url))
+        self._pool.start()
+        deadline = None if self._duration is None else time.monotonic() + self._duration
+        while not self._stopped.is_set():
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                break
+            # signals are handled between waits, so keep them short
+            self._stopped.wait(1.0 if timeout is None else min(timeout, 1.0))
+        self._pool.stop()
+        self._pool.join()
+        for server in self._servers:
+            server.stop()
+        if self._alarms is not None:
+            self._alarms.close()
+        for device in self._devices:
+            if device.tracer is not None:
+                device.tracer.close()
+        return self.done
+
+    def _alarm(self, event):
+        sample = event.sample
+        sys.stderr.write("%s: alarm %s %s at %02d:%02d:%02d (T1 %.2f, T2 %.2f)\n" % (
+            (event.device, event.rule, event.state) + sample.time + (sample.t1, sample.t2)))
+
+    def _listener(self, tty):
+        def listener(event, data):
+            if event == 'started' and self._verbose:
+                sys.stderr.write("%s: started\n" % tty)
+            elif event == 'error':
+                sys.stderr.write("%s: error: %s\n" % (tty, data))
+            elif event == 'stopped':
+                if self._verbose:
+                    sys.stderr.write("%s: stopped\n" % tty)
+                with self._lock:
+                    self._running -= 1
+                    if not self._running:
+                        self._stopped.set()  # nothing left to record
+        return listener
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record CHY506R measurements without GUI")
+    parser.add_argument('ttys', nargs='+', metavar='TTY', help="serial port(s) the devices are connected to")
+    parser.add_argument('-o', '--output', default='chy506r-{tty}',
+                        help="output file, '{tty}' is replaced with TTY name (default: %(default)s)")
+    parser.add_argument('-f', '--format', choices=FORMATS,
+                        help="output format, appended as extension if missing (default: by extension, csv)")
+    parser.add_argument('-d', '--duration', type=float, help="stop after that many seconds")
+    parser.add_argument('--flush-every', type=int, default=1, metavar='N',
+                        help="write to disk every N samples (default: %(default)s)")
+    parser.add_argument('--flush-interval', type=float, metavar='SECONDS',
+                        help="write to disk at least every SECONDS")
+    parser.add_argument('--fsync', action='store_true', help="fsync after each write to disk")
+    parser.add_argument('--rollups', action='store_true', help="maintain rolled-up tiers next to output")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="serve live samples over HTTP, next devices on next ports")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="record per-sample latency traces, '{tty}' is replaced with TTY name")
+    parser.add_argument('--alarm', action='append', default=[], metavar='RULE',
+                        help="alarm rule 'NAME: CONDITION [| option=value ...]', e.g. "
+                             "'hot: t1 > 1200 | hysteresis=10' (may be repeated)")
+    parser.add_argument('--alarms', metavar='FILE', help="file with alarm rules, one per line")
+    parser.add_argument('--alarm-exec', metavar='COMMAND',
+                        help="shell command run on each alarm event (see api.CommandAction)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="report device state changes")
+    args = parser.parse_args(argv)
+
+    format = args.format
+    if format is None and not os.path.splitext(args.output)[1]:
+        format = 'csv'
+    outputs = [output_path(args.output, tty, format) for tty in args.ttys]
+    if len(set(outputs)) != len(outputs):
+        parser.error("output must contain '{tty}' when recording several devices")
+    traces = None
+    if args.trace:
+        traces = [output_path(args.trace, tty) for tty in args.ttys]
+        if len(set(traces)) != len(traces):
+            parser.error("trace must contain '{tty}' when recording several devices")
+
+    serve = None
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        try:
+            serve = (host or '127.0.0.1', int(port))
+        except ValueError:
+            parser.error("invalid --serve address: %s" % args.serve)
+
+    alarms = None
+    try:
+        rules = api.load_rules(args.alarms) if args.alarms else []
+        rules += [api.Rule.parse(rule) for rule in args.alarm]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if rules:
+        alarms = api.AlarmEngine(rules)
+        if args.alarm_exec:
+            alarms.add_action(api.CommandAction(args.alarm_exec))
+
+    flush = api.FlushPolicy(args.flush_every, args.flush_interval, args.fsync)
+    logger = Logger(args.ttys, outputs, args.duration, flush, args.rollups or None, args.verbose,
+                    serve, traces, alarms)
+    for signum in (signal.SIGINT, signal.SIGTERM, getattr(signal, 'SIGHUP', None)):
+        if signum is not None:
+            signal.signal(signum, lambda signum, frame: logger.stop())
+    if args.verbose:
+        for tty, output in zip(args.ttys, outputs):
+            sys.stderr.write("%s -> %s\n" % (tty, output))
+    done = logger.run()
+    if args.verbose:
+        for tty, device in zip(args.ttys, logger.devices):
+            metrics = device.metrics
+            sys.stderr.write("%s: %d samples, %d frames, %d protocol errors\n" % (
+                tty, device.count, metrics['frames_total'].value, metrics['protocol_errors_total'].value))
+            stats = device.stats
+            for name, channel in (('T1', stats.t1), ('T2', stats.t2)):
+                if channel.count:
+                    sys.stderr.write("%s: %s min %.2f, max %.2f, mean %.2f\n" % (
+                        tty, name, channel.min, channel.max, channel.mean))
+            if device.tracer is not None:
+                for name, stats in device.tracer.summary().items():
+                    sys.stderr.write("%s: %-9s mean %.6fs, max %.6fs\n" % (tty, name, stats['mean'], stats['max']))
+    return 0 if done else 1
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
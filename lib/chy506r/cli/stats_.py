@@ -0,0 +1,90 @@
+# -*- coding: utf8 -*-
+"""Statistics of recorded logs, computed in a single streaming pass.
+"""
+
+import argparse
+import json
+import sys
+
+from .. import api
+
+__all__ = ('format_time', 'format_report', 'stats_main')
+
+
+def format_time(seconds):
+    """Format seconds since midnight of the first day as 'HH:MM:SS', or
+    'D HH:MM:SS' past the first day (see api.parse_time())"""
+    if seconds is None:
+        return '-'
+    day, seconds = divmod(int(seconds), 86400)
+    hms = '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return '%d %s' % (day, hms) if day else hms
+
+
+def _value(value):
+    return '-' if value is None else '%.3f' % value
+
+
+def format_report(path, stats, qs=api.QUANTILES):
+    """Returns text report of LogStatistics of log at path"""
+    channels = list(stats.channels.items())
+    rows = [
+        ('samples', ['%d' % c.count for _, c in channels]),
+        ('min', ['%s at %s' % (_value(c.min), format_time(c.min_time)) for _, c in channels]),
+        ('max', ['%s at %s' % (_value(c.max), format_time(c.max_time)) for _, c in channels]),
+        ('mean', [_value(c.mean) for _, c in channels]),
+        ('stddev', [_value(c.stddev) for _, c in channels]),
+    ]
+    quantiles = [c.quantiles(qs) for _, c in channels]
+    for i, q in enumerate(qs):
+        rows.append(('p%g' % (q * 100), [_value(values[i]) for values in quantiles]))
+    rows.append(('ramp/min', ['%s at %s' % (_value(c.max_ramp), format_time(c.max_ramp_time))
+                              for _, c in channels]))
+    width = max(len(v) for _, values in rows for v in values)
+    lines = ["%s: %s .. %s" % (path, format_time(stats.first), format_time(stats.last)),
+             "%-10s" % '' + ''.join(" %*s" % (width, name.upper()) for name, _ in channels)]
+    for name, values in rows:
+        lines.append("%-10s" % name + ''.join(" %*s" % (width, v) for v in values))
+    return '\n'.join(lines) + '\n'
+
+
+def stats_main(argv=None):
+    parser = argparse.ArgumentParser(description="Statistics of recorded CHY506R logs")
+    parser.add_argument('logs', nargs='+', metavar='LOG', help="CSV, binary log or SQLite database")
+    parser.add_argument('-w', '--ramp-window', type=float, default=60, metavar='SECONDS',
+                        help="window of the rate of change (default: %(default)s)")
+    parser.add_argument('-r', '--resolution', type=float, default=0.1,
+                        help="resolution of quantiles in °C (default: %(default)s)")
+    parser.add_argument('-q', '--quantiles', default=','.join('%g' % q for q in api.QUANTILES),
+                        help="comma separated quantiles (default: %(default)s)")
+    parser.add_argument('-s', '--session', type=int, help="session of SQLite databases (default: last)")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of text")
+    args = parser.parse_args(argv)
+    try:
+        qs = [float(q) for q in args.quantiles.split(',')]
+    except ValueError:
+        parser.error("invalid quantiles: %s" % args.quantiles)
+
+    reports = {}
+    status = 0
+    for path in args.logs:
+        try:
+            stats = api.analyze(path, args.ramp_window, args.resolution, session=args.session)
+        except (OSError, ValueError) as e:
+            sys.stderr.write("error: %s: %s\n" % (path, e))
+            status = 1
+            continue
+        if args.json:
+            reports[path] = stats.summary(qs)
+        else:
+            sys.stdout.write(format_report(path, stats, qs))
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return status
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
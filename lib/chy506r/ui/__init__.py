@@ -6,6 +6,7 @@ util.import_all_from(__package__, [
     '.inputchooser_',
     '.outputchooser_',
     '.controller_',
-])
+    '.events_',
+], lazy=True)
 
 # vim: set ft=python et ts=4 sw=4:
@@ -80,11 +80,24 @@ class App(tk.Frame, metaclass=_AppMeta):
 
     def _update_status_bar(self):
         if self.controller.device_running():
-            text = "Measurements in progress (%d samples collected)..." % \
-                   self.controller.device.count
+            device = self.controller.device
+            errors = device.metrics['protocol_errors_total'].value
+            text = "Measurements in progress (%d samples collected, %d errors)..." % \
+                   (self.controller.count, errors)
+            stats = device.stats
+            for name, channel in (('T1', stats.t1), ('T2', stats.t2)):
+                if channel.count:
+                    rate = channel.rates[60]
+                    text += "  %s: %.1f (%.1f..%.1f%s)" % (
+                        name, channel.last, channel.min, channel.max,
+                        '' if rate is None else ', %+.1f/min' % rate)
+            alarms = self.controller.alarms
+            if alarms:
+                text += "  ALARM: %s" % ', '.join(alarms)
         else:
             text = "Idle"
-        self._status_bar['text'] = text
+        if self._status_bar['text'] != text:
+            self._status_bar['text'] = text
 
 
 # Local Variables:
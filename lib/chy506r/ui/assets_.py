@@ -0,0 +1,77 @@
+# -*- coding: utf8 -*-
+"""Defines image assets shared by UI widgets
+"""
+
+import tkinter as tk
+import weakref
+
+from . import images_
+
+__all__ = ('image', 'Animation')
+
+
+# Tk root -> {(name, index): PhotoImage or None}
+_cache = weakref.WeakKeyDictionary()
+
+
+def image(widget, name, index=None):
+    """Returns PhotoImage of asset name (see images_), or of its frame index
+    if it's an animated GIF. Images are decoded on first use and shared by
+    all widgets of the application. Returns None if there is no such frame"""
+    root = widget._root()
+    images = _cache.setdefault(root, {})
+    key = (name, index)
+    if key not in images:
+        options = {'master': root, 'data': getattr(images_, name)}
+        if index is not None:
+            options['format'] = 'gif -index %d' % index
+        try:
+            images[key] = tk.PhotoImage(**options)
+        except tk.TclError:
+            images[key] = None  # past the last frame
+    return images[key]
+
+
+class Animation(object):
+    """Shows frames of an animated GIF asset on a label in a loop.
+
+    Frames are decoded when displayed for the first time. Nothing is
+    scheduled while the animation is paused."""
+
+    def __init__(self, label, name, interval=125):
+        self._label = label
+        self._name = name
+        self._interval = interval
+        self._index = 0
+        self._timer = None
+
+    @property
+    def running(self):
+        """Whether the animation is running (not paused)"""
+        return self._timer is not None
+
+    def start(self):
+        """Start (or resume) the animation"""
+        if self._timer is None:
+            self._step()
+
+    def pause(self):
+        """Pause the animation at current frame"""
+        if self._timer is not None:
+            self._label.after_cancel(self._timer)
+            self._timer = None
+
+    def _step(self):
+        frame = image(self._label, self._name, self._index)
+        if frame is None:
+            self._index = 0
+            frame = image(self._label, self._name, self._index)
+        self._label.configure(image=frame)
+        self._index += 1
+        self._timer = self._label.after(self._interval, self._step)
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
@@ -5,8 +5,10 @@
 import tkinter as tk
 import tkinter.messagebox as messagebox
 import os
+import sys
 
-from . import images_
+from . import assets_
+from .events_ import EventQueue
 from .. import api
 
 __all__ = ('Controller',)
@@ -20,12 +22,22 @@ class Controller(tk.Frame):
         super().__init__(master)
 
         self._device = None
+        self._generation = 0  # identifies events of current device
+        self._count = 0
+        self._widget_state = {}
+        self._bus = api.SampleBus()
         self._plotter = None
         self._updatecommand = kw.get('updatecommand', lambda: True)
         self._input_chooser = kw.get('input_chooser', master.input_chooser)
         self._output_chooser = kw.get('output_chooser', master.output_chooser)
         self._create_widgets()
         self._image.index = 1
+        self._events = EventQueue(self)
+        self._events.connect('started', self._device_started)
+        self._events.connect('sample', self._device_sample)
+        self._events.connect('stopped', self._device_stopped)
+        self._events.connect('alarm', self._alarm)
+        self._alarms = self._create_alarms()
 
     @property
     def image(self):
@@ -55,6 +67,18 @@ class Controller(tk.Frame):
     def device(self):
         return self._device
 
+    @property
+    def count(self):
+        """Number of samples collected by the current device"""
+        return self._count
+
+    @property
+    def alarms(self):
+        """Names of raised alarms"""
+        if self._alarms is None:
+            return []
+        return [rule for _, rule in self._alarms.active()]
+
     @property
     def plotter(self):
         return self._plotter
@@ -78,28 +102,33 @@ class Controller(tk.Frame):
         device_running = self.device_running()
         start = not device_running and self.tty and self.output
         stop = device_running
-        plot = not self.plotter_running() and (device_running and self._device.count >= 2)
-        self._start_button['state'] = tk.NORMAL if start else tk.DISABLED
-        self._stop_button['state'] = tk.NORMAL if stop else tk.DISABLED
-        self._plot_button['state'] = tk.NORMAL if plot else tk.DISABLED
-        self._update_image()
+        plot = not self.plotter_running() and (device_running and self._count >= 2)
+        self._set_state(self._start_button, start)
+        self._set_state(self._stop_button, stop)
+        self._set_state(self._plot_button, plot)
+        if device_running:
+            self._animation.start()
+        else:
+            self._animation.pause()
 
     def stop(self):
         self._stop_device()
         self._stop_plotter()
+        self._animation.pause()
+        if self._alarms is not None:
+            self._alarms.close()
 
-    def _update_image(self):
-        if self.device_running():
-            self.image.configure(image=self._image_frames[self._image_index])
-            self._image_index += 1
-            if self._image_index == 30:
-                self._image_index = 0
+    def _set_state(self, button, enabled):
+        """Configure button state, but only if it differs"""
+        state = tk.NORMAL if enabled else tk.DISABLED
+        if self._widget_state.get(button) != state:
+            self._widget_state[button] = state
+            button['state'] = state
 
     def _create_widgets(self):
-        data = self._image_data()
-        self._image_frames = [tk.PhotoImage(data=data, format='gif -index %i' % i) for i in range(30)]
-        self._image_index = 0
-        self._image = tk.Label(self, image=self._image_frames[0], width='16m')
+        name = self._image_name()
+        self._image = tk.Label(self, image=assets_.image(self, name, 0), width='16m')
+        self._animation = assets_.Animation(self._image, name)
         self._start_button = tk.Button(self, text='Start', state=tk.DISABLED, command=self._start_device)
         self._stop_button = tk.Button(self, text='Stop', state=tk.DISABLED, command=self._stop_device)
         self._plot_button = tk.Button(self, text='Plot', state=tk.DISABLED, command=self._start_plotter)
@@ -109,26 +138,46 @@ class Controller(tk.Frame):
         self.stop_button.pack(side=tk.LEFT, padx=2, pady=4, fill=tk.BOTH)
         self.plot_button.pack(side=tk.LEFT, padx=2, pady=4, fill=tk.BOTH)
 
+    def _create_alarms(self):
+        """Alarm rules are read from file given by CHY506R_ALARMS, see
+        api.load_rules()"""
+        path = os.environ.get('CHY506R_ALARMS')
+        if not path:
+            return None
+        try:
+            engine = api.AlarmEngine(api.load_rules(path), [lambda event: self._events.put('alarm', event)])
+        except (OSError, ValueError) as e:
+            sys.stderr.write("warning: alarms disabled: %s\n" % e)
+            return None
+        engine.attach(self._bus)
+        return engine
+
     def _start_device(self):
         if os.path.exists(self.output) and not self.output_chooser.override:
             answer = self.output_chooser.select()  # try to not override existing file
             if not answer:
                 return
         self.output_chooser.override = False
-        self._device = api.Chy506R(self.tty, self.output)
+        self._generation += 1
+        self._count = 0
+        generation = self._generation
+        listener = lambda event, data: self._events.put(event, (generation, data))
+        # acquisition in a separate process is not delayed by the GUI
+        device = api.AcquisitionProcess if os.environ.get('CHY506R_PROCESS') else api.Chy506R
+        self._device = device(self.tty, self.output, listener=listener, bus=self._bus)
         self._device.start()
         self._updatecommand()
-        self.after(125, self._watch_device)
 
     def _stop_device(self):
         if self.device_running():
             self._device.stop()
             self._device.join()
             self._device = None
+            self._generation += 1  # ignore remaining events of the device
         self._updatecommand()
 
     def _start_plotter(self):
-        self._plotter = api.Plotter(self.output)
+        self._plotter = api.LivePlotter(self.output, bus=self._bus)
         self._plotter.start()
         self._updatecommand()
 
@@ -139,17 +188,34 @@ class Controller(tk.Frame):
             self._plotter = None
             self._updatecommand()
 
-    def _watch_device(self):
-        self._updatecommand()
-        if self.device_running():
-            self.after(125, self._watch_device)
-        else:
-            if self.device is not None and not self.device.done:
+    def _device_started(self, event):
+        generation, _ = event
+        if generation == self._generation:
+            self._updatecommand()
+
+    def _device_sample(self, event):
+        generation, count = event
+        if generation == self._generation:
+            self._count = count
+            self._updatecommand()
+
+    def _device_stopped(self, event):
+        generation, done = event
+        if generation == self._generation:
+            self._device.join()
+            self._updatecommand()
+            if not done:
                 messagebox.showwarning("Warning", "Measurements aborted. " +
                                        "Is the device connected to PC?")
+
+    def _alarm(self, event):
+        if event.state == api.RAISED:
+            self.bell()
+        self._updatecommand()
+
     @classmethod
-    def _image_data(self):
-        return images_.spinning_gear
+    def _image_name(self):
+        return 'spinning_gear'
 
 # Local Variables:
 # # tab-width:4
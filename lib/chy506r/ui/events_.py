@@ -0,0 +1,72 @@
+# -*- coding: utf8 -*-
+"""Defines EventQueue class
+"""
+
+import os
+import queue
+import tkinter as tk
+
+__all__ = ('EventQueue',)
+
+
+class EventQueue(object):
+    """Passes events from worker threads to the Tk main loop.
+
+    put() may be called from any thread; handlers connected with connect()
+    are then invoked in the Tk main loop. The Tk loop is woken up through
+    a pipe registered with createfilehandler(), so nothing is polled while
+    there are no events (on platforms without file handlers the queue is
+    polled every poll milliseconds instead)."""
+
+    def __init__(self, widget, poll=125):
+        self._widget = widget
+        self._poll = poll
+        self._queue = queue.Queue()
+        self._handlers = {}
+        self._pipe_r, self._pipe_w = os.pipe()
+        self._filehandler = True
+        try:
+            widget.tk.createfilehandler(self._pipe_r, tk.READABLE, self._readable)
+        except (AttributeError, tk.TclError):  # no file handlers (Windows)
+            self._filehandler = False
+            self._widget.after(self._poll, self._drain_periodically)
+
+    def connect(self, event, handler):
+        """Call handler(data) in the Tk main loop for each put(event, data)"""
+        self._handlers.setdefault(event, []).append(handler)
+
+    def put(self, event, data=None):
+        """Queue an event, can be called from any thread"""
+        self._queue.put((event, data))
+        if self._filehandler:
+            os.write(self._pipe_w, b'\0')
+
+    def drain(self):
+        """Dispatch all queued events"""
+        while True:
+            try:
+                event, data = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            for handler in self._handlers.get(event, ()):
+                handler(data)
+
+    def close(self):
+        if self._filehandler:
+            self._widget.tk.deletefilehandler(self._pipe_r)
+        os.close(self._pipe_r)
+        os.close(self._pipe_w)
+
+    def _drain_periodically(self):
+        self.drain()
+        self._widget.after(self._poll, self._drain_periodically)
+
+    def _readable(self, fd, mask):
+        os.read(self._pipe_r, 4096)
+        self.drain()
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4:
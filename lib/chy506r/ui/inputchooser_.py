@@ -9,7 +9,8 @@ import glob
 import os
 import pathlib
 
-from . import images_
+from . import assets_
+from .. import api
 
 __all__ = ('InputChooser',)
 
@@ -36,9 +37,8 @@ class InputChooser(tk.Frame):
         return self._selection
 
     def _create_widgets(self):
-        image = tk.PhotoImage(data=self._image_data())
+        image = assets_.image(self, self._image_name())
         self._label = tk.Label(self, image=image, width='16m')
-        self._label.image = image  # Keep a reference!
         self._combobox = ttk.Combobox(self, **self._combo_options())
         # layout
         self.label.pack(side=tk.LEFT, fill=tk.BOTH, padx=2, pady=4)
@@ -74,11 +74,12 @@ class InputChooser(tk.Frame):
     def _generate_values(self):
         serials = glob.glob('/dev/serial/by-id/*')
         values = [os.path.realpath(f) for f in serials]
+        values.extend(api.virtual_ttys())
         self.combobox['values'] = values
 
     @classmethod
-    def _image_data(cls):
-        return images_.input_file
+    def _image_name(cls):
+        return 'input_file'
 
 # Local Variables:
 # # tab-width:4
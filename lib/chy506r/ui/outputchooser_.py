@@ -5,7 +5,7 @@
 import tkinter as tk
 import tkinter.filedialog as filedialog
 
-from . import images_
+from . import assets_
 
 __all__ = ('OutputChooser',)
 
@@ -47,7 +47,10 @@ class OutputChooser(tk.Frame):
         self._override = value
 
     def select(self):
-        types = [('Comma Separated Values', '*.csv'), ('All files', '*')]
+        types = [('Comma Separated Values', '*.csv'),
+                 ('CHY506R binary log', '*.bin'),
+                 ('SQLite database', '*.db'),
+                 ('All files', '*')]
         config = {'master': self.master, 'defaultextension': '.csv', 'filetypes': types}
         if self._selection:
             config['initialfile'] = self._selection
@@ -60,17 +63,16 @@ class OutputChooser(tk.Frame):
         return answer
 
     def _create_widgets(self):
-        image = tk.PhotoImage(data=self._image_data())
+        image = assets_.image(self, self._image_name())
         self._button = tk.Button(self, image=image, width='16m', command=self.select)
-        self._button.image = image  # Keep a reference!
         self._label = tk.Label(self, borderwidth=1, relief=tk.RIDGE, text='No file selected')
         # layout
         self.button.pack(side=tk.LEFT, padx=2, pady=4, fill=tk.BOTH)
         self.label.pack(side=tk.LEFT, padx=2, pady=4, fill=tk.X, expand=True)
 
     @classmethod
-    def _image_data(cls):
-        return images_.output_file
+    def _image_name(cls):
+        return 'output_file'
 
 
 
@@ -3,25 +3,37 @@
 """
 
 import importlib
-import inspect
+import importlib.util
+import types
+import re
 import sys
 
-__all__ = ('import_all_from', 'import_from')
+__all__ = ('import_all_from', 'import_from', 'lazy_import_from')
 
 
-def import_all_from(target, modules, module_package=None, **kw):
+def import_all_from(target, modules, module_package=None, lazy=False, **kw):
     """Imports symbols from multiple modules.
 
        For each module in modules, this is an equivalent of:
 
             from module import *
             __all__ += module.__all__
+
+       With lazy=True, modules given by name are not imported; their
+       __all__ is read from the source and the module gets imported on
+       first access to any of its symbols (see lazy_import_from()).
     """
-    if isinstance(modules, str) or inspect.ismodule(modules):
+    if isinstance(modules, str) or isinstance(modules, types.ModuleType):
         modules = (modules,)
     target_module, target = _get_module_and_name(target)
     for module in modules:
         if isinstance(module, str):
+            if lazy and _lazy_supported:
+                name = importlib.util.resolve_name(module, module_package or target)
+                symbols = static_all_symbols(name)
+                if symbols is not None:
+                    lazy_import_from(target_module, name, symbols, **kw)
+                    continue
             module = importlib.import_module(module, module_package or target)
         import_from(target_module, module, all_symbols(module), **kw)
 
@@ -35,6 +47,60 @@ def import_from(target, source, symbols, **kw):
         target.__all__ += target.__all__.__class__(symbols)
 
 
+def lazy_import_from(target, source, symbols, **kw):
+    """Like import_from(), but source (a module name) gets imported on first
+    access to any of symbols in target (through module __getattr__)"""
+    lazy = target.__dict__.get('__lazy_symbols__')
+    if lazy is None:
+        lazy = target.__lazy_symbols__ = {}
+        target.__getattr__ = _lazy_getattr(target, lazy)
+        target.__dir__ = lambda: sorted(set(target.__dict__) | set(lazy))
+    for symbol in symbols:
+        lazy[symbol] = source
+    if kw.get('__all__', True):
+        if not hasattr(target, '__all__'):
+            target.__all__ = ()
+        target.__all__ += target.__all__.__class__(symbols)
+
+
+def _lazy_getattr(target, lazy):
+    def __getattr__(symbol):
+        try:
+            source = lazy[symbol]
+        except KeyError:
+            raise AttributeError("module %r has no attribute %r" % (target.__name__, symbol))
+        module = importlib.import_module(source)
+        for name in all_symbols(module):
+            if lazy.get(name) == source:
+                # set before dropping the entry, other threads may be
+                # resolving the same symbols concurrently
+                setattr(target, name, getattr(module, name))
+                lazy.pop(name, None)
+        return target.__dict__[symbol]
+    return __getattr__
+
+
+# literal __all__ tuple or list at module level
+_all_re = re.compile(r'^__all__\s*=\s*(\(.*?\)|\[.*?\])\s*$', re.MULTILINE | re.DOTALL)
+_symbol_re = re.compile(r"""['"](\w+)['"]""")
+
+
+def static_all_symbols(name):
+    """Return __all__ of module name, read from its source without importing
+    it; None if it can't be determined statically"""
+    spec = importlib.util.find_spec(name)
+    try:
+        source = spec.loader.get_source(name)
+    except (AttributeError, ImportError):
+        return None
+    if source is None:
+        return None
+    match = _all_re.search(source)
+    if match is None:
+        return None
+    return tuple(_symbol_re.findall(match.group(1)))
+
+
 def all_symbols(module):
     if hasattr(module, '__all__'):
         return module.__all__
@@ -42,6 +108,10 @@ def all_symbols(module):
         return dir(module)
 
 
+# module __getattr__ (PEP 562) is available since Python 3.7
+_lazy_supported = sys.version_info >= (3, 7)
+
+
 def _get_module_and_name(mod):
     """Return a module object and its name for module given as either a name
        or a module object."""
@@ -0,0 +1,60 @@
+# -*- coding: utf8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'lib'))
+
+from chy506r.api import stats_  # noqa: E402
+
+
+_damaged = (b"TIME;T1;T2\n"
+            b"00:00:01;1.000000;2.000000\n"
+            b"00:00:02;2.000000;3.000000\n"
+            b"\n"
+            b"TIME;T1;T2\n"
+            b"00:00:03;3.000000;4.000000\n"
+            b"00:00:04;4.000000;5.000000\n")
+
+
+class AnalyzeCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_damaged)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def check(self, stats):
+        self.assertEqual((stats.first, stats.last), (1, 4))
+        t1, t2 = stats['t1'], stats['t2']
+        self.assertEqual(t1.count, 4)
+        self.assertEqual((t1.min, t1.max, t1.mean), (1.0, 4.0, 2.5))
+        self.assertEqual((t2.min, t2.max, t2.mean), (2.0, 5.0, 3.5))
+
+    def test_blank_line_and_repeated_header(self):
+        self.check(stats_.analyze(self.path))
+
+    def test_small_chunks(self):
+        self.check(stats_.analyze(self.path, rows=1))
+
+    def test_without_numpy(self):
+        numpy, stats_.numpy = stats_.numpy, None
+        try:
+            self.check(stats_.analyze(self.path))
+        finally:
+            stats_.numpy = numpy
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# Local Variables:
+# # tab-width:4
+# # indent-tabs-mode:nil
+# # End:
+# vim: set syntax=python expandtab tabstop=4 shiftwidth=4: